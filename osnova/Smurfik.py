@@ -1,12 +1,26 @@
 import os
 import time
-import threading
 import logging
-from datetime import datetime, time as dt_time, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from dotenv import load_dotenv
 import telebot
 from telebot import types
-from json_database import JSONDatabase
+from storage import CLEANUP_BATCH, CLEANUP_INTERVAL, open_database
+from delivery import DeliveryEngine
+from scheduler import Scheduler
+from notifier import ExpiryNotifier
+from render_cache import RenderCache
+from dialogs import STEP_DAYS, STEP_PRIORITY, STEP_TEXT, DialogStore
+from webhook import WebhookServer
+import metrics
+from digest import DIGEST_IN_PROCESS, daily_digests, parse_delivery_time, sync_digest_jobs
+from views import (
+    ERROR_TEXT, MAIN_MENU, QUICK_ADD_HELP, REMINDERS_PAGE_SIZE, confirm_deletion_markup, days_markup,
+    format_added, format_added_many, format_expiry_notice, format_greeting, multi_delete_markup,
+    multi_delete_selection, parse_quick_add, priority_markup, render_delete_choice, render_history,
+    render_reminders
+)
 load_dotenv()
 # Настройка логгера
 logging.basicConfig(
@@ -19,72 +33,77 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-bot = telebot.TeleBot(os.getenv('TOKEN'))
-db = JSONDatabase('reminders_data.json')  # Инициализируем JSON базу данных
+# BOT_MODE: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# В режиме webhook обработчики вызываются прямо в потоках WebhookServer: собственный пул
+# TeleBot разорвал бы порядок обновлений чата и сделал бы очереди сервера бесполезными
+bot = telebot.TeleBot(os.getenv('TOKEN'), threaded=BOT_MODE != 'webhook')
+db = open_database()  # JSON или SQLite хранилище (DB_BACKEND), при DB_SHARDS > 1 — маршрутизатор по шардам
+scheduler = Scheduler('scheduler_state.json')
 
-# Эмодзи для приоритетов
-PRIORITY_EMOJIS = {
-    5: "🔴‼️",
-    4: "🟠",
-    3: "🟡",
-    2: "🟢",
-    1: "🔵",
-    0: "⚪️"
-}
+def send_markdown(chat_id, text):
+    return bot.send_message(chat_id, text, parse_mode="Markdown")
 
-def send_daily_reminders():
+def send_daily_reminders(tz_name=None, include=None, exclude=frozenset()):
     """Отправляет напоминания, срок которых истекает сегодня"""
     try:
-        users = db.get_all_users()
-        if not users:
-            logger.info("Нет пользователей для рассылки")
-            return
-
-        for user_id in users:
-            try:
-                reminders = db.get_current_day_reminders(user_id)
-                if not reminders:
-                    continue
-                    
-                message = "📅 *Ваши задачи на сегодня:*\n\n"
-                for reminder in reminders:
-                    id_ = reminder['id']
-                    text = reminder['text']
-                    priority = reminder['priority']
-                    emoji = PRIORITY_EMOJIS.get(priority, "")
-                    message += f"{emoji} *{text}* (Приоритет: {priority}/5)\nID: {id_}\n\n"
-                
-                try:
-                    bot.send_message(user_id, message, parse_mode="Markdown")
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке пользователю {user_id}: {e}")
-
-            except Exception as e:
-                logger.error(f"Ошибка обработки пользователя {user_id}: {e}")
+        engine = DeliveryEngine(send_markdown, workers=int(os.getenv('DELIVERY_WORKERS', '8')))
+        stats = engine.run(daily_digests(db, tz_name, include, exclude))
+        logger.info(f"Ежедневная рассылка завершена: {stats.summary()}")
 
     except Exception as e:
         logger.error(f"Критическая ошибка в send_daily_reminders: {e}")
 
-def check_scheduled_tasks():
-    """Проверяет и выполняет scheduled задачи"""
-    while True:
-        now = datetime.now()
-        current_time = now.time()
-        
-        # Ежедневная рассылка в 8:00
-        if current_time.hour == 8 and current_time.minute == 0:
-            send_daily_reminders()
-            time.sleep(60)  # Защита от дублирования
-        
-        # Удаление старых напоминаний в 00:00
-        if current_time.hour == 0 and current_time.minute == 0:
-            db.delete_old_reminders()
-            time.sleep(60)
-        
-        time.sleep(30)  # Проверяем каждые 30 секунд
-
+# Истекшие напоминания удаляются порциями, без пикового прохода в полночь
+# (при DIGEST_IN_PROCESS=0 очистку шардов запускает shard_worker.py)
+if DIGEST_IN_PROCESS:
+    scheduler.add_interval('cleanup', lambda: db.delete_old_reminders(CLEANUP_BATCH), CLEANUP_INTERVAL)
+sync_digest_jobs(scheduler, db, send_daily_reminders)
 # Запускаем планировщик в фоновом режиме
-threading.Thread(target=check_scheduled_tasks, daemon=True).start()
+scheduler.start()
+
+# Уведомления в момент наступления срока каждого напоминания
+notice_engine = DeliveryEngine(send_markdown)
+notice_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='notice')
+
+def notify_reminder(reminder_id):
+    """Отправляет уведомление о наступлении срока напоминания"""
+    reminder = db.get_reminder(reminder_id)
+    if reminder is None or reminder['is_completed']:
+        return
+    # Отправка с повторами идет в пуле, чтобы не задерживать следующие уведомления
+    notice_pool.submit(notice_engine.deliver, reminder['user_id'], format_expiry_notice(reminder))
+
+notifier = ExpiryNotifier(notify_reminder)
+db.add_listener(notifier.on_storage_event)
+notifier.load(db.get_reminder_expiries(datetime.now()))
+notifier.start()
+
+# Готовые списки и клавиатуры; сбрасываются при любом изменении напоминаний пользователя
+render_cache = RenderCache(int(os.getenv('RENDER_CACHE_SIZE', '1024')))
+db.add_listener(render_cache.on_storage_event)
+
+# Незавершенные диалоги добавления: переживают перезапуск, брошенные истекают через DIALOG_TTL
+dialogs = DialogStore(
+    ttl=float(os.getenv('DIALOG_TTL', '900')),
+    path=os.getenv('DIALOG_STATE_PATH', 'dialogs.json') or None
+)
+scheduler.add_interval('dialog_eviction', dialogs.evict_expired, 300)
+
+# Регистрируется первым: ответ внутри диалога важнее кнопок меню, как было с register_next_step_handler
+@bot.message_handler(func=lambda message: dialogs.get(message.chat.id) is not None)
+def continue_add_reminder(message):
+    """Передает ответ пользователя обработчику текущего шага диалога"""
+    state = dialogs.pop(message.chat.id)
+    if state is None:
+        return
+    step, data = state
+    if step == STEP_TEXT:
+        add_reminder_step2(message)
+    elif step == STEP_PRIORITY:
+        add_reminder_step3(message, data['text'])
+    elif step == STEP_DAYS:
+        add_reminder_step4(message, data['text'], data['priority'])
 
 @bot.message_handler(commands=['start'])
 def start(message):
@@ -92,35 +111,56 @@ def start(message):
         user = message.from_user
         db.add_user(user.id, user.username, user.first_name, user.last_name)
         
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        btn1 = types.KeyboardButton('➕ Добавить напоминание')
-        btn2 = types.KeyboardButton('📋 Мои напоминания')
-        btn3 = types.KeyboardButton('❌ Удалить напоминание')
-        btn4 = types.KeyboardButton('🗑 История удаленных')
-        markup.add(btn1, btn2, btn3, btn4)
-        
         bot.send_message(
             message.chat.id,
-            f"Привет, {user.first_name}! Я бот-напоминалка.\n"
-            "Используйте кнопки ниже для управления напоминаниями.",
-            reply_markup=markup
+            format_greeting(user.first_name),
+            reply_markup=MAIN_MENU
         )
     except Exception as e:
         logger.error(f"Ошибка в обработчике start: {e}")
-        bot.send_message(message.chat.id, "⚠️ Произошла ошибка. Попробуйте позже.")
+        bot.send_message(message.chat.id, ERROR_TEXT)
+
+@bot.message_handler(commands=['time'])
+def set_delivery_time(message):
+    try:
+        args = message.text.split()[1:]
+        if not args:
+            bot.send_message(
+                message.chat.id,
+                "Укажите время рассылки и, при желании, часовой пояс:\n"
+                "/time 09:30 Europe/Moscow\n"
+                "/time reset — вернуть рассылку в 08:00"
+            )
+            return
+        delivery_time, tz_name = parse_delivery_time(args)
+    except Exception:
+        bot.send_message(message.chat.id, "Неверный формат. Пример: /time 09:30 Europe/Moscow")
+        return
+
+    try:
+        if not db.set_user_schedule(message.chat.id, delivery_time, tz_name):
+            raise Exception("Не удалось сохранить время рассылки")
+        sync_digest_jobs(scheduler, db, send_daily_reminders)
+        if delivery_time:
+            bot.send_message(message.chat.id, f"✅ Ежедневная рассылка в {delivery_time} {tz_name or ''}".strip())
+        else:
+            bot.send_message(message.chat.id, "✅ Ежедневная рассылка в 08:00")
+    except Exception as e:
+        logger.error(f"Ошибка в set_delivery_time: {e}")
+        bot.send_message(message.chat.id, ERROR_TEXT)
 
 @bot.message_handler(func=lambda message: message.text == '➕ Добавить напоминание')
 def add_reminder_step1(message):
     try:
-        msg = bot.send_message(
+        bot.send_message(
             message.chat.id, 
             "Напишите текст напоминания (макс. 500 символов):",
             reply_markup=types.ReplyKeyboardRemove()
         )
-        bot.register_next_step_handler(msg, add_reminder_step2)
+        dialogs.set(message.chat.id, STEP_TEXT)
     except Exception as e:
         logger.error(f"Ошибка в add_reminder_step1: {e}")
-        bot.send_message(message.chat.id, "⚠️ Произошла ошибка. Попробуйте позже.")
+        bot.send_message(message.chat.id, ERROR_TEXT)
 
 def add_reminder_step2(message):
     try:
@@ -133,16 +173,12 @@ def add_reminder_step2(message):
             bot.send_message(message.chat.id, "Текст слишком длинный (макс. 500 символов).")
             return
         
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-        for i in range(6):
-            markup.add(types.KeyboardButton(str(i)))
-        
-        msg = bot.send_message(
+        bot.send_message(
             message.chat.id,
             "Выберите приоритет (0-5), где 0 - низкий, 5 - очень высокий:",
-            reply_markup=markup
+            reply_markup=priority_markup()
         )
-        bot.register_next_step_handler(msg, add_reminder_step3, text)
+        dialogs.set(message.chat.id, STEP_PRIORITY, {'text': text})
     except Exception as e:
         logger.error(f"Ошибка в add_reminder_step2: {e}")
         bot.send_message(message.chat.id, "⚠️ Произошла ошибка. Начните заново.")
@@ -152,27 +188,23 @@ def add_reminder_step3(message, text):
         priority = int(message.text)
         if priority < 0 or priority > 5:
             raise ValueError
-    except ValueError:
+    except (TypeError, ValueError):
         bot.send_message(message.chat.id, "Пожалуйста, введите число от 0 до 5")
         return
     
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    for i in range(1, 8):
-        markup.add(types.KeyboardButton(str(i)))
-    
-    msg = bot.send_message(
+    bot.send_message(
         message.chat.id,
         "На сколько дней установить напоминание (1-7)?",
-        reply_markup=markup
+        reply_markup=days_markup()
     )
-    bot.register_next_step_handler(msg, add_reminder_step4, text, priority)
+    dialogs.set(message.chat.id, STEP_DAYS, {'text': text, 'priority': priority})
 
 def add_reminder_step4(message, text, priority):
     try:
         days = int(message.text)
         if days < 1 or days > 7:
             raise ValueError
-    except ValueError:
+    except (TypeError, ValueError):
         bot.send_message(message.chat.id, "Пожалуйста, введите число от 1 до 7")
         return
     
@@ -180,25 +212,11 @@ def add_reminder_step4(message, text, priority):
         reminder_id = db.add_reminder(message.chat.id, text, priority, days)
         if not reminder_id:
             raise Exception("Не удалось добавить напоминание")
-            
-        expires_date = (datetime.now() + timedelta(days=days)).strftime('%d.%m.%Y')
-        
-        # Создаем клавиатуру с основными кнопками
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        btn1 = types.KeyboardButton('➕ Добавить напоминание')
-        btn2 = types.KeyboardButton('📋 Мои напоминания')
-        btn3 = types.KeyboardButton('❌ Удалить напоминание')
-        btn4 = types.KeyboardButton('🗑 История удаленных')
-        markup.add(btn1, btn2, btn3, btn4)
         
         bot.send_message(
             message.chat.id,
-            f"✅ Напоминание добавлено!\n"
-            f"ID: {reminder_id}\n"
-            f"Текст: {text}\n"
-            f"Приоритет: {priority}\n"
-            f"Активно до: {expires_date}",
-            reply_markup=markup  # Добавляем клавиатуру с кнопками
+            format_added(reminder_id, text, priority, days),
+            reply_markup=MAIN_MENU  # Добавляем клавиатуру с кнопками
         )
     except Exception as e:
         logger.error(f"Ошибка в add_reminder_step4: {e}")
@@ -211,53 +229,52 @@ def add_reminder_step4(message, text, priority):
 @bot.message_handler(func=lambda message: message.text == '📋 Мои напоминания')
 def show_reminders(message):
     try:
-        # Получаем все активные напоминания (не только на сегодня)
-        reminders = db.get_today_reminders(message.chat.id)
-        if not reminders:
+        # Все активные напоминания (не только на сегодня), повторные нажатия отдаются из кэша
+        page = render_cache.get(message.chat.id, ('reminders', 0), lambda: render_reminders(db, message.chat.id))
+        if page is None:
             bot.send_message(message.chat.id, "У вас нет активных напоминаний.")
             return
         
-        message_text = "📋 *Ваши активные напоминания:*\n\n"
-        for reminder in reminders:
-            id_ = reminder['id']
-            text = reminder['text']
-            priority = reminder['priority']
-            emoji = PRIORITY_EMOJIS.get(priority, "")
-            expires_at = datetime.fromisoformat(db.data['reminders'][str(id_)]['expires_at'])
-            expires_str = expires_at.strftime('%d.%m.%Y')
-            
-            message_text += (
-                f"{emoji} *{text}*\n"
-                f"Приоритет: {priority}/5\n"
-                f"ID: {id_}\n"
-                f"Активно до: {expires_str}\n\n"
-            )
-        
+        text, markup = page
         bot.send_message(
             message.chat.id,
-            message_text,
-            parse_mode="Markdown"
+            text,
+            parse_mode="Markdown",
+            reply_markup=markup
         )
     except Exception as e:
         logger.error(f"Ошибка в show_reminders: {e}")
-        bot.send_message(message.chat.id, "⚠️ Произошла ошибка. Попробуйте позже.")
+        bot.send_message(message.chat.id, ERROR_TEXT)
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('rem:'))
+def show_reminders_page(call):
+    try:
+        offset = int(call.data.split(':')[1])
+        user_id = call.message.chat.id
+        page = render_cache.get(user_id, ('reminders', offset), lambda: render_reminders(db, user_id, offset))
+        if page is None:
+            bot.answer_callback_query(call.id, "Больше напоминаний нет")
+            return
+        text, markup = page
+        bot.edit_message_text(
+            text,
+            call.message.chat.id,
+            call.message.message_id,
+            parse_mode="Markdown",
+            reply_markup=markup
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в show_reminders_page: {e}")
+        bot.answer_callback_query(call.id, "⚠️ Ошибка при получении напоминаний")
 
 @bot.message_handler(func=lambda message: message.text == '❌ Удалить напоминание')
 def ask_reminder_to_delete(message):
     try:
-        reminders = db.get_today_reminders(message.chat.id)
-        if not reminders:
+        markup = render_cache.get(message.chat.id, ('delete', 0), lambda: render_delete_choice(db, message.chat.id))
+        if markup is None:
             bot.send_message(message.chat.id, "У вас нет активных напоминаний для удаления.")
             return
         
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-        for reminder in reminders:
-            id_ = reminder['id']
-            text = reminder['text']
-            btn_text = f"❌ Удалить #{id_}: {text[:20]}..." if len(text) > 20 else f"❌ Удалить #{id_}: {text}"
-            markup.add(types.KeyboardButton(btn_text))
-        markup.add(types.KeyboardButton("Отмена"))
-        
         bot.send_message(
             message.chat.id,
             "Выберите напоминание для удаления:",
@@ -265,31 +282,45 @@ def ask_reminder_to_delete(message):
         )
     except Exception as e:
         logger.error(f"Ошибка в ask_reminder_to_delete: {e}")
-        bot.send_message(message.chat.id, "⚠️ Произошла ошибка. Попробуйте позже.")
+        bot.send_message(message.chat.id, ERROR_TEXT)
 
-@bot.message_handler(func=lambda message: message.text.startswith('❌ Удалить #'))
-def process_deletion(message):
+@bot.callback_query_handler(func=lambda call: call.data.startswith('delp:'))
+def show_delete_page(call):
     try:
-        if message.text == "Отмена":
-            bot.send_message(
-                message.chat.id,
-                "Удаление отменено.",
-                reply_markup=types.ReplyKeyboardRemove()
-            )
+        offset = int(call.data.split(':')[1])
+        user_id = call.message.chat.id
+        markup = render_cache.get(user_id, ('delete', offset), lambda: render_delete_choice(db, user_id, offset))
+        if markup is None:
+            bot.answer_callback_query(call.id, "Больше напоминаний нет")
             return
-            
-        reminder_id = int(message.text.split('#')[1].split(':')[0])
-        
-        # Создаем inline-клавиатуру для подтверждения
-        markup = types.InlineKeyboardMarkup()
-        markup.add(
-            types.InlineKeyboardButton("✅ Да", callback_data=f"del_confirm_{reminder_id}"),
-            types.InlineKeyboardButton("❌ Нет", callback_data="del_cancel")
+        bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=markup)
+    except Exception as e:
+        logger.error(f"Ошибка в show_delete_page: {e}")
+        bot.answer_callback_query(call.id, "⚠️ Ошибка при получении напоминаний")
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('del_ask_'))
+def ask_deletion_confirmation(call):
+    try:
+        reminder_id = int(call.data.split('_')[-1])
+        bot.edit_message_text(
+            f"Вы уверены, что хотите удалить напоминание #{reminder_id}?",
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=confirm_deletion_markup(reminder_id)
         )
+    except Exception as e:
+        logger.error(f"Ошибка в ask_deletion_confirmation: {e}")
+        bot.answer_callback_query(call.id, "⚠️ Не удалось обработать запрос")
+
+# Ответ с клавиатуры выбора, отправленной до перехода на inline-страницы
+@bot.message_handler(func=lambda message: message.text and message.text.startswith('❌ Удалить #'))
+def process_deletion(message):
+    try:
+        reminder_id = int(message.text.split('#')[1].split(':')[0])
         bot.send_message(
             message.chat.id,
             "Вы уверены, что хотите удалить это напоминание?",
-            reply_markup=markup
+            reply_markup=confirm_deletion_markup(reminder_id)  # inline-клавиатура для подтверждения
         )
     except Exception as e:
         logger.error(f"Ошибка в process_deletion: {e}")
@@ -330,46 +361,160 @@ def cancel_deletion(call):
     except Exception as e:
         logger.error(f"Ошибка в cancel_deletion: {e}")
 
+@bot.message_handler(commands=['add_many'])
+def quick_add(message):
+    """Несколько напоминаний одним сообщением: по одному на строку"""
+    items, errors = parse_quick_add(message.text)
+    if errors or not items:
+        bot.send_message(message.chat.id, "\n".join(errors) if errors else QUICK_ADD_HELP)
+        return
+
+    try:
+        reminder_ids = db.add_reminders(message.chat.id, items)
+        if not reminder_ids:
+            raise Exception("Не удалось добавить напоминания")
+        bot.send_message(message.chat.id, format_added_many(reminder_ids, items), reply_markup=MAIN_MENU)
+    except Exception as e:
+        logger.error(f"Ошибка в quick_add: {e}")
+        bot.send_message(message.chat.id, "⚠️ Не удалось добавить напоминания. Попробуйте позже.")
+
+@bot.message_handler(commands=['delete_many'])
+def ask_reminders_to_delete(message):
+    try:
+        reminders, has_more = db.get_reminders_page(message.chat.id, 0, REMINDERS_PAGE_SIZE)
+        if not reminders:
+            bot.send_message(message.chat.id, "У вас нет активных напоминаний для удаления.")
+            return
+
+        bot.send_message(
+            message.chat.id,
+            "Отметьте напоминания для удаления (выбор действует в пределах страницы):",
+            reply_markup=multi_delete_markup(reminders, 0, has_more)
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в ask_reminders_to_delete: {e}")
+        bot.send_message(message.chat.id, ERROR_TEXT)
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith(('mdel:', 'mdel_page:')))
+def toggle_reminder_selection(call):
+    try:
+        selected, offset = multi_delete_selection(call.message.reply_markup)
+        if call.data.startswith('mdel_page:'):
+            # Переход на другую страницу: отметки остаются только у видимых кнопок
+            selected, offset = set(), int(call.data.split(':')[1])
+        else:
+            selected ^= {int(call.data.split(':')[1])}
+        # Клавиатура собирается заново: истекшие за это время напоминания из нее пропадают
+        reminders, has_more = db.get_reminders_page(call.message.chat.id, offset, REMINDERS_PAGE_SIZE)
+        selected &= {reminder['id'] for reminder in reminders}
+        bot.edit_message_reply_markup(
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=multi_delete_markup(reminders, offset, has_more, selected)
+        )
+        bot.answer_callback_query(call.id)
+    except Exception as e:
+        logger.error(f"Ошибка в toggle_reminder_selection: {e}")
+        bot.answer_callback_query(call.id, "⚠️ Ошибка при выборе")
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('mdel_apply:'))
+def confirm_multi_deletion(call):
+    try:
+        selected, _ = multi_delete_selection(call.message.reply_markup)
+        if not selected:
+            bot.answer_callback_query(call.id, "Ничего не выбрано")
+            return
+        deleted = db.delete_reminders(sorted(selected), call.message.chat.id)
+        bot.edit_message_text(
+            f"Удалено напоминаний: {len(deleted)}",
+            call.message.chat.id,
+            call.message.message_id
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в confirm_multi_deletion: {e}")
+        bot.answer_callback_query(call.id, "⚠️ Ошибка при удалении")
+
 @bot.message_handler(func=lambda message: message.text == '🗑 История удаленных')
 @bot.message_handler(commands=['history'])
 def show_deleted_history(message):
     try:
-        deleted = db.get_deleted_reminders(message.chat.id)
-        if not deleted:
+        page = render_cache.get(message.chat.id, ('history', None, False), lambda: render_history(db, message.chat.id))
+        if page is None:
             bot.send_message(message.chat.id, "У вас нет удаленных напоминаний.")
             return
-        response = "🗑 *История удаленных напоминаний:*\n\n"
-        for item in deleted:
-            original_id = item['original_id']
-            text = item['text']
-            priority = item['priority']
-            deleted_at = datetime.fromisoformat(item['deleted_at'])
-            reason = item['reason']
-            
-            response += (
-                f"🔹 *ID:* {original_id}\n"
-                f"📝 *Текст:* {text}\n"
-                f"🔢 *Приоритет:* {priority}\n"
-                f"🗓 *Удалено:* {deleted_at.strftime('%d.%m.%Y %H:%M')}\n"
-                f"ℹ️ *Причина:* {reason}\n\n"
-            )
         
+        text, markup = page
         bot.send_message(
             message.chat.id,
-            response,
-            parse_mode="Markdown"
+            text,
+            parse_mode="Markdown",
+            reply_markup=markup
         )
     except Exception as e:
         logger.error(f"Ошибка в show_deleted_history: {e}")
         bot.send_message(message.chat.id, "⚠️ Произошла ошибка при получении истории.")
 
+@bot.callback_query_handler(func=lambda call: call.data.startswith(('history:', 'history_new:')))
+def show_history_page(call):
+    try:
+        direction, cursor = call.data.split(':', 1)
+        newer = direction == 'history_new'
+        user_id = call.message.chat.id
+        page = render_cache.get(
+            user_id, ('history', cursor, newer), lambda: render_history(db, user_id, cursor, newer)
+        )
+        if page is None:
+            bot.answer_callback_query(call.id, "Больше записей нет")
+            return
+        text, markup = page
+        bot.edit_message_text(
+            text,
+            call.message.chat.id,
+            call.message.message_id,
+            parse_mode="Markdown",
+            reply_markup=markup
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в show_history_page: {e}")
+        bot.answer_callback_query(call.id, "⚠️ Ошибка при получении истории")
+
+def run_webhook():
+    """Прием обновлений через встроенный HTTP-сервер (BOT_MODE=webhook)"""
+    secret = os.getenv('WEBHOOK_SECRET')
+    path = os.getenv('WEBHOOK_PATH', '/webhook')
+    server = WebhookServer(
+        lambda update: bot.process_new_updates([types.Update.de_json(update)]),
+        host=os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+        port=int(os.getenv('WEBHOOK_PORT', '8443')),
+        path=path,
+        secret_token=secret,
+        workers=int(os.getenv('WEBHOOK_WORKERS', '4')),
+        queue_size=int(os.getenv('WEBHOOK_QUEUE', '1000'))
+    )
+    # Без WEBHOOK_URL адрес регистрируется вручную (или сервер проверяется локально через curl)
+    if os.getenv('WEBHOOK_URL'):
+        bot.set_webhook(url=os.getenv('WEBHOOK_URL').rstrip('/') + path, secret_token=secret)
+    try:
+        server.serve_forever()
+    finally:
+        server.stop()
+
 def start_bot():
+    # Метрики (и профилировщик) на 127.0.0.1:METRICS_PORT, только если порт задан
+    metrics.instrument_handlers(bot)
+    if os.getenv('METRICS_PORT'):
+        metrics.start_http_server(int(os.getenv('METRICS_PORT')))
     while True:
         try:
-            logger.info("Бот запущен...")
-            bot.infinity_polling()
+            logger.info(f"Бот запущен ({BOT_MODE})...")
+            if BOT_MODE == 'webhook':
+                run_webhook()
+            else:
+                bot.infinity_polling()
         except KeyboardInterrupt:
             logger.info("Бот остановлен пользователем")
+            logger.info(f"Кэш экранов: {render_cache.summary()}")
+            dialogs.close()
             db.close()
             break
         except Exception as e:
@@ -378,4 +523,4 @@ def start_bot():
             continue
 
 if __name__ == '__main__':
-    start_bot()
\ No newline at end of file
+    start_bot()
@@ -0,0 +1,529 @@
+"""Асинхронная версия бота на AsyncTeleBot.
+
+Запуск: python async_bot.py. Обращения к хранилищу выполняются в пуле потоков,
+планировщик работает как задача того же event loop, а ExpiryNotifier ждет сроков
+в своем потоке и передает отправку уведомлений в event loop.
+"""
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from dotenv import load_dotenv
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from storage import CLEANUP_BATCH, CLEANUP_INTERVAL, open_database
+from delivery import AsyncDeliveryEngine
+from scheduler import Scheduler
+from notifier import ExpiryNotifier
+from render_cache import RenderCache
+from dialogs import STEP_DAYS, STEP_PRIORITY, STEP_TEXT, DialogStore
+import metrics
+from digest import DIGEST_IN_PROCESS, daily_digests, parse_delivery_time, sync_digest_jobs
+from views import (
+    ERROR_TEXT, MAIN_MENU, QUICK_ADD_HELP, REMINDERS_PAGE_SIZE, confirm_deletion_markup, days_markup,
+    format_added, format_added_many, format_expiry_notice, format_greeting, multi_delete_markup,
+    multi_delete_selection, parse_quick_add, priority_markup, render_delete_choice, render_history,
+    render_reminders
+)
+load_dotenv()
+# Настройка логгера
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('bot_errors.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+bot = AsyncTeleBot(os.getenv('TOKEN'))
+db = open_database()  # JSON или SQLite хранилище (DB_BACKEND), при DB_SHARDS > 1 — маршрутизатор по шардам
+scheduler = Scheduler('scheduler_state.json')
+notice_engine = AsyncDeliveryEngine(lambda chat_id, text: bot.send_message(chat_id, text, parse_mode="Markdown"))
+
+# Незавершенные диалоги добавления: переживают перезапуск, брошенные истекают через DIALOG_TTL
+dialogs = DialogStore(
+    ttl=float(os.getenv('DIALOG_TTL', '900')),
+    path=os.getenv('DIALOG_STATE_PATH', 'dialogs.json') or None
+)
+loop = None
+schedule_changed = None
+
+
+async def run_db(func, *args):
+    """Выполняет обращение к хранилищу в пуле потоков, не блокируя event loop"""
+    return await asyncio.to_thread(func, *args)
+
+
+async def send_daily_reminders(tz_name=None, include=None, exclude=frozenset()):
+    """Отправляет напоминания, срок которых истекает сегодня"""
+    try:
+        engine = AsyncDeliveryEngine(
+            lambda chat_id, text: bot.send_message(chat_id, text, parse_mode="Markdown"),
+            workers=int(os.getenv('DELIVERY_WORKERS', '8'))
+        )
+        # Генератор читает хранилище; run_async перебирает его в потоке и не держит всю рассылку в памяти
+        stats = await engine.run_async(daily_digests(db, tz_name, include, exclude))
+        logger.info(f"Ежедневная рассылка завершена: {stats.summary()}")
+    except Exception as e:
+        logger.error(f"Критическая ошибка в send_daily_reminders: {e}")
+
+
+def schedule_digest(tz_name, include, exclude):
+    # Задачи планировщика выполняются в потоке пула: ждем завершения корутины рассылки
+    asyncio.run_coroutine_threadsafe(send_daily_reminders(tz_name, include, exclude), loop).result()
+
+
+# Готовые списки и клавиатуры; сбрасываются при любом изменении напоминаний пользователя
+render_cache = RenderCache(int(os.getenv('RENDER_CACHE_SIZE', '1024')))
+db.add_listener(render_cache.on_storage_event)
+
+
+async def run_scheduler():
+    """Задача event loop: спит до ближайшей задачи планировщика или до изменения расписания"""
+    while True:
+        next_run = scheduler.next_due()
+        timeout = None if next_run is None else max(0.0, next_run - time.time())
+        try:
+            await asyncio.wait_for(schedule_changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        schedule_changed.clear()
+        scheduler.run_pending(executor=lambda job: loop.run_in_executor(None, job))
+
+
+async def notify_reminder(reminder_id):
+    """Отправляет уведомление о наступлении срока напоминания"""
+    # Корутину запускает поток ExpiryNotifier и результат не ждет: ошибки логируются здесь
+    try:
+        reminder = await run_db(db.get_reminder, reminder_id)
+        if reminder is None or reminder['is_completed']:
+            return
+        await notice_engine.deliver_async(reminder['user_id'], format_expiry_notice(reminder))
+    except Exception as e:
+        logger.error(f"Ошибка в notify_reminder для напоминания {reminder_id}: {e}")
+
+
+@bot.message_handler(func=lambda message: dialogs.get(message.chat.id) is not None)
+async def continue_add_reminder(message):
+    """Продолжает диалог добавления напоминания (замена register_next_step_handler)"""
+    state = dialogs.pop(message.chat.id)
+    if state is None:
+        return
+    step, data = state
+    if step == STEP_TEXT:
+        await add_reminder_step2(message)
+    elif step == STEP_PRIORITY:
+        await add_reminder_step3(message, data['text'])
+    elif step == STEP_DAYS:
+        await add_reminder_step4(message, data['text'], data['priority'])
+
+
+@bot.message_handler(commands=['start'])
+async def start(message):
+    try:
+        user = message.from_user
+        await run_db(db.add_user, user.id, user.username, user.first_name, user.last_name)
+        await bot.send_message(
+            message.chat.id,
+            format_greeting(user.first_name),
+            reply_markup=MAIN_MENU
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в обработчике start: {e}")
+        await bot.send_message(message.chat.id, ERROR_TEXT)
+
+
+@bot.message_handler(commands=['time'])
+async def set_delivery_time(message):
+    try:
+        args = message.text.split()[1:]
+        if not args:
+            await bot.send_message(
+                message.chat.id,
+                "Укажите время рассылки и, при желании, часовой пояс:\n"
+                "/time 09:30 Europe/Moscow\n"
+                "/time reset — вернуть рассылку в 08:00"
+            )
+            return
+        delivery_time, tz_name = parse_delivery_time(args)
+    except Exception:
+        await bot.send_message(message.chat.id, "Неверный формат. Пример: /time 09:30 Europe/Moscow")
+        return
+
+    try:
+        if not await run_db(db.set_user_schedule, message.chat.id, delivery_time, tz_name):
+            raise Exception("Не удалось сохранить время рассылки")
+        await run_db(sync_digest_jobs, scheduler, db, schedule_digest)
+        schedule_changed.set()
+        if delivery_time:
+            await bot.send_message(message.chat.id, f"✅ Ежедневная рассылка в {delivery_time} {tz_name or ''}".strip())
+        else:
+            await bot.send_message(message.chat.id, "✅ Ежедневная рассылка в 08:00")
+    except Exception as e:
+        logger.error(f"Ошибка в set_delivery_time: {e}")
+        await bot.send_message(message.chat.id, ERROR_TEXT)
+
+
+@bot.message_handler(func=lambda message: message.text == '➕ Добавить напоминание')
+async def add_reminder_step1(message):
+    try:
+        await bot.send_message(
+            message.chat.id,
+            "Напишите текст напоминания (макс. 500 символов):",
+            reply_markup=types.ReplyKeyboardRemove()
+        )
+        dialogs.set(message.chat.id, STEP_TEXT)
+    except Exception as e:
+        logger.error(f"Ошибка в add_reminder_step1: {e}")
+        await bot.send_message(message.chat.id, ERROR_TEXT)
+
+
+async def add_reminder_step2(message):
+    try:
+        if not message.text or len(message.text.strip()) == 0:
+            await bot.send_message(message.chat.id, "Текст напоминания не может быть пустым.")
+            return
+
+        text = message.text.strip()
+        if len(text) > 500:
+            await bot.send_message(message.chat.id, "Текст слишком длинный (макс. 500 символов).")
+            return
+
+        await bot.send_message(
+            message.chat.id,
+            "Выберите приоритет (0-5), где 0 - низкий, 5 - очень высокий:",
+            reply_markup=priority_markup()
+        )
+        dialogs.set(message.chat.id, STEP_PRIORITY, {'text': text})
+    except Exception as e:
+        logger.error(f"Ошибка в add_reminder_step2: {e}")
+        await bot.send_message(message.chat.id, "⚠️ Произошла ошибка. Начните заново.")
+
+
+async def add_reminder_step3(message, text):
+    try:
+        priority = int(message.text)
+        if priority < 0 or priority > 5:
+            raise ValueError
+    except (TypeError, ValueError):
+        await bot.send_message(message.chat.id, "Пожалуйста, введите число от 0 до 5")
+        return
+
+    await bot.send_message(
+        message.chat.id,
+        "На сколько дней установить напоминание (1-7)?",
+        reply_markup=days_markup()
+    )
+    dialogs.set(message.chat.id, STEP_DAYS, {'text': text, 'priority': priority})
+
+
+async def add_reminder_step4(message, text, priority):
+    try:
+        days = int(message.text)
+        if days < 1 or days > 7:
+            raise ValueError
+    except (TypeError, ValueError):
+        await bot.send_message(message.chat.id, "Пожалуйста, введите число от 1 до 7")
+        return
+
+    try:
+        # Запись на диск идет в пуле потоков и не задерживает другие чаты
+        reminder_id = await run_db(db.add_reminder, message.chat.id, text, priority, days)
+        if not reminder_id:
+            raise Exception("Не удалось добавить напоминание")
+
+        await bot.send_message(
+            message.chat.id,
+            format_added(reminder_id, text, priority, days),
+            reply_markup=MAIN_MENU
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в add_reminder_step4: {e}")
+        await bot.send_message(
+            message.chat.id,
+            "⚠️ Не удалось добавить напоминание. Попробуйте позже.",
+            reply_markup=types.ReplyKeyboardRemove()
+        )
+
+
+@bot.message_handler(func=lambda message: message.text == '📋 Мои напоминания')
+async def show_reminders(message):
+    try:
+        # Промах кэша идет в базу в пуле потоков, попадание не трогает базу вовсе
+        page = await run_db(
+            render_cache.get, message.chat.id, ('reminders', 0), lambda: render_reminders(db, message.chat.id)
+        )
+        if page is None:
+            await bot.send_message(message.chat.id, "У вас нет активных напоминаний.")
+            return
+        text, markup = page
+        await bot.send_message(message.chat.id, text, parse_mode="Markdown", reply_markup=markup)
+    except Exception as e:
+        logger.error(f"Ошибка в show_reminders: {e}")
+        await bot.send_message(message.chat.id, ERROR_TEXT)
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('rem:'))
+async def show_reminders_page(call):
+    try:
+        offset = int(call.data.split(':')[1])
+        user_id = call.message.chat.id
+        page = await run_db(
+            render_cache.get, user_id, ('reminders', offset), lambda: render_reminders(db, user_id, offset)
+        )
+        if page is None:
+            await bot.answer_callback_query(call.id, "Больше напоминаний нет")
+            return
+        text, markup = page
+        await bot.edit_message_text(
+            text, call.message.chat.id, call.message.message_id, parse_mode="Markdown", reply_markup=markup
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в show_reminders_page: {e}")
+        await bot.answer_callback_query(call.id, "⚠️ Ошибка при получении напоминаний")
+
+
+@bot.message_handler(func=lambda message: message.text == '❌ Удалить напоминание')
+async def ask_reminder_to_delete(message):
+    try:
+        markup = await run_db(
+            render_cache.get, message.chat.id, ('delete', 0), lambda: render_delete_choice(db, message.chat.id)
+        )
+        if markup is None:
+            await bot.send_message(message.chat.id, "У вас нет активных напоминаний для удаления.")
+            return
+        await bot.send_message(
+            message.chat.id,
+            "Выберите напоминание для удаления:",
+            reply_markup=markup
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в ask_reminder_to_delete: {e}")
+        await bot.send_message(message.chat.id, ERROR_TEXT)
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('delp:'))
+async def show_delete_page(call):
+    try:
+        offset = int(call.data.split(':')[1])
+        user_id = call.message.chat.id
+        markup = await run_db(
+            render_cache.get, user_id, ('delete', offset), lambda: render_delete_choice(db, user_id, offset)
+        )
+        if markup is None:
+            await bot.answer_callback_query(call.id, "Больше напоминаний нет")
+            return
+        await bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=markup)
+    except Exception as e:
+        logger.error(f"Ошибка в show_delete_page: {e}")
+        await bot.answer_callback_query(call.id, "⚠️ Ошибка при получении напоминаний")
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('del_ask_'))
+async def ask_deletion_confirmation(call):
+    try:
+        reminder_id = int(call.data.split('_')[-1])
+        await bot.edit_message_text(
+            f"Вы уверены, что хотите удалить напоминание #{reminder_id}?",
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=confirm_deletion_markup(reminder_id)
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в ask_deletion_confirmation: {e}")
+        await bot.answer_callback_query(call.id, "⚠️ Не удалось обработать запрос")
+
+
+# Ответ с клавиатуры выбора, отправленной до перехода на inline-страницы
+@bot.message_handler(func=lambda message: message.text and message.text.startswith('❌ Удалить #'))
+async def process_deletion(message):
+    try:
+        reminder_id = int(message.text.split('#')[1].split(':')[0])
+        await bot.send_message(
+            message.chat.id,
+            "Вы уверены, что хотите удалить это напоминание?",
+            reply_markup=confirm_deletion_markup(reminder_id)
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в process_deletion: {e}")
+        await bot.send_message(
+            message.chat.id,
+            "⚠️ Не удалось обработать запрос. Попробуйте еще раз.",
+            reply_markup=types.ReplyKeyboardRemove()
+        )
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('del_confirm_'))
+async def confirm_deletion(call):
+    try:
+        reminder_id = int(call.data.split('_')[-1])
+        if await run_db(db.delete_reminder, reminder_id, call.message.chat.id):
+            text = "Напоминание успешно удалено!"
+        else:
+            text = "Не удалось найти напоминание для удаления"
+        await bot.edit_message_text(text, call.message.chat.id, call.message.message_id)
+    except Exception as e:
+        logger.error(f"Ошибка в confirm_deletion: {e}")
+        await bot.answer_callback_query(call.id, "⚠️ Ошибка при удалении")
+
+
+@bot.callback_query_handler(func=lambda call: call.data == 'del_cancel')
+async def cancel_deletion(call):
+    try:
+        await bot.edit_message_text("Удаление отменено", call.message.chat.id, call.message.message_id)
+    except Exception as e:
+        logger.error(f"Ошибка в cancel_deletion: {e}")
+
+
+@bot.message_handler(commands=['add_many'])
+async def quick_add(message):
+    """Несколько напоминаний одним сообщением: по одному на строку"""
+    items, errors = parse_quick_add(message.text)
+    if errors or not items:
+        await bot.send_message(message.chat.id, "\n".join(errors) if errors else QUICK_ADD_HELP)
+        return
+
+    try:
+        reminder_ids = await run_db(db.add_reminders, message.chat.id, items)
+        if not reminder_ids:
+            raise Exception("Не удалось добавить напоминания")
+        await bot.send_message(message.chat.id, format_added_many(reminder_ids, items), reply_markup=MAIN_MENU)
+    except Exception as e:
+        logger.error(f"Ошибка в quick_add: {e}")
+        await bot.send_message(message.chat.id, "⚠️ Не удалось добавить напоминания. Попробуйте позже.")
+
+
+@bot.message_handler(commands=['delete_many'])
+async def ask_reminders_to_delete(message):
+    try:
+        reminders, has_more = await run_db(db.get_reminders_page, message.chat.id, 0, REMINDERS_PAGE_SIZE)
+        if not reminders:
+            await bot.send_message(message.chat.id, "У вас нет активных напоминаний для удаления.")
+            return
+        await bot.send_message(
+            message.chat.id,
+            "Отметьте напоминания для удаления (выбор действует в пределах страницы):",
+            reply_markup=multi_delete_markup(reminders, 0, has_more)
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в ask_reminders_to_delete: {e}")
+        await bot.send_message(message.chat.id, ERROR_TEXT)
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith(('mdel:', 'mdel_page:')))
+async def toggle_reminder_selection(call):
+    try:
+        selected, offset = multi_delete_selection(call.message.reply_markup)
+        if call.data.startswith('mdel_page:'):
+            # Переход на другую страницу: отметки остаются только у видимых кнопок
+            selected, offset = set(), int(call.data.split(':')[1])
+        else:
+            selected ^= {int(call.data.split(':')[1])}
+        # Клавиатура собирается заново: истекшие за это время напоминания из нее пропадают
+        reminders, has_more = await run_db(db.get_reminders_page, call.message.chat.id, offset, REMINDERS_PAGE_SIZE)
+        selected &= {reminder['id'] for reminder in reminders}
+        await bot.edit_message_reply_markup(
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=multi_delete_markup(reminders, offset, has_more, selected)
+        )
+        await bot.answer_callback_query(call.id)
+    except Exception as e:
+        logger.error(f"Ошибка в toggle_reminder_selection: {e}")
+        await bot.answer_callback_query(call.id, "⚠️ Ошибка при выборе")
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('mdel_apply:'))
+async def confirm_multi_deletion(call):
+    try:
+        selected, _ = multi_delete_selection(call.message.reply_markup)
+        if not selected:
+            await bot.answer_callback_query(call.id, "Ничего не выбрано")
+            return
+        deleted = await run_db(db.delete_reminders, sorted(selected), call.message.chat.id)
+        await bot.edit_message_text(f"Удалено напоминаний: {len(deleted)}", call.message.chat.id, call.message.message_id)
+    except Exception as e:
+        logger.error(f"Ошибка в confirm_multi_deletion: {e}")
+        await bot.answer_callback_query(call.id, "⚠️ Ошибка при удалении")
+
+
+@bot.message_handler(func=lambda message: message.text == '🗑 История удаленных')
+@bot.message_handler(commands=['history'])
+async def show_deleted_history(message):
+    try:
+        page = await run_db(
+            render_cache.get, message.chat.id, ('history', None, False), lambda: render_history(db, message.chat.id)
+        )
+        if page is None:
+            await bot.send_message(message.chat.id, "У вас нет удаленных напоминаний.")
+            return
+        text, markup = page
+        await bot.send_message(message.chat.id, text, parse_mode="Markdown", reply_markup=markup)
+    except Exception as e:
+        logger.error(f"Ошибка в show_deleted_history: {e}")
+        await bot.send_message(message.chat.id, "⚠️ Произошла ошибка при получении истории.")
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith(('history:', 'history_new:')))
+async def show_history_page(call):
+    try:
+        direction, cursor = call.data.split(':', 1)
+        newer = direction == 'history_new'
+        user_id = call.message.chat.id
+        page = await run_db(
+            render_cache.get, user_id, ('history', cursor, newer), lambda: render_history(db, user_id, cursor, newer)
+        )
+        if page is None:
+            await bot.answer_callback_query(call.id, "Больше записей нет")
+            return
+        text, markup = page
+        await bot.edit_message_text(
+            text, call.message.chat.id, call.message.message_id, parse_mode="Markdown", reply_markup=markup
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в show_history_page: {e}")
+        await bot.answer_callback_query(call.id, "⚠️ Ошибка при получении истории")
+
+
+async def main():
+    global loop, schedule_changed
+    loop = asyncio.get_running_loop()
+    schedule_changed = asyncio.Event()
+
+    # Истекшие напоминания удаляются порциями, без пикового прохода в полночь
+    # (при DIGEST_IN_PROCESS=0 очистку шардов запускает shard_worker.py)
+    if DIGEST_IN_PROCESS:
+        scheduler.add_interval('cleanup', lambda: db.delete_old_reminders(CLEANUP_BATCH), CLEANUP_INTERVAL)
+    scheduler.add_interval('dialog_eviction', dialogs.evict_expired, 300)
+    sync_digest_jobs(scheduler, db, schedule_digest)
+    scheduler_task = asyncio.create_task(run_scheduler())
+
+    # Метрики (и профилировщик) на 127.0.0.1:METRICS_PORT, только если порт задан
+    metrics.instrument_handlers(bot)
+    if os.getenv('METRICS_PORT'):
+        metrics.start_http_server(int(os.getenv('METRICS_PORT')))
+
+    notifier = ExpiryNotifier(
+        lambda reminder_id: asyncio.run_coroutine_threadsafe(notify_reminder(reminder_id), loop)
+    )
+    db.add_listener(notifier.on_storage_event)
+    notifier.load(await run_db(db.get_reminder_expiries, datetime.now()))
+    notifier.start()
+
+    try:
+        logger.info("Асинхронный бот запущен...")
+        await bot.infinity_polling()
+    finally:
+        scheduler_task.cancel()
+        notifier.stop()
+        logger.info(f"Кэш экранов: {render_cache.summary()}")
+        dialogs.close()
+        await run_db(db.close)
+        logger.info("Бот остановлен")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
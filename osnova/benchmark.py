@@ -0,0 +1,169 @@
+"""Нагрузочный замер хранилища и ежедневной рассылки на синтетических данных.
+
+Запуск: python benchmark.py --reminders 100000 --users 10000 [--backend json|sqlite]
+        [--ops 2000] [--memory] [--only load,save,add,today,current_day,cleanup,broadcast]
+
+Для каждой операции печатает число вызовов, пропускную способность, p50/p99
+задержки и, с --memory, пиковый прирост памяти по tracemalloc (tracemalloc
+замедляет код, поэтому время и память лучше смотреть в разных запусках).
+Рассылка идет через настоящие daily_digests и DeliveryEngine с заглушкой
+вместо bot.send_message и без ограничений скорости.
+"""
+import os
+import gc
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+OPERATIONS = ('load', 'save', 'add', 'today', 'current_day', 'cleanup', 'broadcast')
+
+
+def generate(path: str, reminders: int, users: int, seed: int = 1) -> None:
+    """Пишет data.json заданного размера; сроки разбросаны от вчера до +7 дней"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    data = {
+        'users': {
+            str(user_id): {
+                'username': f'user{user_id}', 'first_name': 'Bench', 'last_name': None,
+                'registered_at': now.isoformat()
+            }
+            for user_id in range(1, users + 1)
+        },
+        'reminders': {},
+        'last_reminder_id': reminders
+    }
+    for reminder_id in range(1, reminders + 1):
+        expires_at = now + timedelta(seconds=rng.randint(-86400, 7 * 86400))
+        data['reminders'][str(reminder_id)] = {
+            'user_id': rng.randint(1, users),
+            'text': f'Синтетическое напоминание {reminder_id}',
+            'priority': rng.randint(0, 5),
+            'created_at': (expires_at - timedelta(days=7)).isoformat(),
+            'expires_at': expires_at.isoformat(),
+            'is_completed': False
+        }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+class Result:
+    def __init__(self, name: str, latencies: List[float], peak: Optional[int] = None):
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.peak = peak
+
+    def percentile(self, p: float) -> float:
+        index = min(len(self.latencies) - 1, int(round(p / 100 * (len(self.latencies) - 1))))
+        return self.latencies[index]
+
+    def row(self) -> str:
+        total = sum(self.latencies)
+        throughput = len(self.latencies) / total if total else float('inf')
+        peak = f"{self.peak / 2 ** 20:9.1f}" if self.peak is not None else f"{'—':>9}"
+        return (
+            f"{self.name:<12} {len(self.latencies):>7} {throughput:>12.1f} "
+            f"{self.percentile(50) * 1000:>10.3f} {self.percentile(99) * 1000:>10.3f} {peak}"
+        )
+
+
+def measure(name: str, func: Callable[..., Any], calls: Iterable[tuple], memory: bool) -> Result:
+    """Вызывает func для каждого набора аргументов и собирает задержки"""
+    gc.collect()
+    if memory:
+        tracemalloc.start()
+    latencies = []
+    try:
+        for args in calls:
+            started = time.perf_counter()
+            func(*args)
+            latencies.append(time.perf_counter() - started)
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return Result(name, latencies, peak)
+
+
+def broadcast(db) -> int:
+    """Полная ежедневная рассылка с заглушкой отправки; возвращает число сообщений"""
+    from delivery import DeliveryEngine
+    from digest import daily_digests
+    engine = DeliveryEngine(lambda chat_id, text: None, workers=8, global_rate=1e9, per_chat_rate=1e9)
+    return engine.run(daily_digests(db)).sent
+
+
+def run(args: argparse.Namespace) -> List[Result]:
+    from storage import open_database
+    only = set(args.only.split(',')) if args.only else set(OPERATIONS)
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    rng = random.Random(2)
+    try:
+        json_path = os.path.join(workdir, 'reminders_data.json')
+        started = time.perf_counter()
+        generate(json_path, args.reminders, args.users)
+        print(f"Данные: {args.reminders} напоминаний, {args.users} пользователей, "
+              f"{os.path.getsize(json_path) / 2 ** 20:.1f} МБ, генерация {time.perf_counter() - started:.1f} с")
+        path = json_path
+        if args.backend == 'sqlite':
+            from migrate_to_sqlite import migrate
+            path = os.path.join(workdir, 'reminders_data.sqlite3')
+            migrate(json_path, path)
+
+        # Фоновая запись выключена, чтобы каждое изменение измерялось вместе с сохранением
+        os.environ['DB_SAVE_DELAY'] = '0'
+        results = []
+        holder: Dict[str, Any] = {}
+        load = measure('load', lambda: holder.update(db=open_database(args.backend, path, shards=1)),
+                       [()], args.memory)
+        db = holder['db']
+        if 'load' in only:
+            results.append(load)
+        user_ids = [rng.randint(1, args.users) for _ in range(args.ops)]
+        if 'save' in only and hasattr(db, 'save_data'):
+            results.append(measure('save', db.save_data, [()] * max(1, args.ops // 100), args.memory))
+        if 'today' in only:
+            results.append(measure('today', db.get_today_reminders, [(u,) for u in user_ids], args.memory))
+        if 'current_day' in only:
+            results.append(measure('current_day', db.get_current_day_reminders, [(u,) for u in user_ids], args.memory))
+        if 'broadcast' in only:
+            sent = []
+            result = measure('broadcast', lambda: sent.append(broadcast(db)), [()], args.memory)
+            results.append(result)
+            print(f"Рассылка: {sent[0]} сообщений, {sent[0] / sum(result.latencies):.0f} сообщений/с")
+        if 'add' in only:
+            # add_reminder без журнала переписывает снимок целиком: число вызовов ограничено
+            calls = args.ops if args.backend == 'sqlite' or getattr(db, 'journal', True) else max(1, args.ops // 100)
+            results.append(measure('add', db.add_reminder, [(u, 'Новое', 3, 1) for u in user_ids[:calls]], args.memory))
+        if 'cleanup' in only:
+            results.append(measure('cleanup', db.delete_old_reminders, [()], args.memory))
+        db.close()
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reminders', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default='json')
+    parser.add_argument('--ops', type=int, default=2000, help='число вызовов для точечных операций')
+    parser.add_argument('--memory', action='store_true', help='замерять пик памяти через tracemalloc')
+    parser.add_argument('--only', help=f"через запятую: {','.join(OPERATIONS)}")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(f"\n{'операция':<12} {'вызовов':>7} {'в секунду':>12} {'p50, мс':>10} {'p99, мс':>10} {'пик, МБ':>9}")
+    for result in results:
+        print(result.row())
+
+
+if __name__ == '__main__':
+    main()
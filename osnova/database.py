@@ -1,8 +1,16 @@
 import os
 import json
+import threading
+from bisect import bisect_left, insort
 from datetime import datetime, timedelta
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+from storage import StorageBackend
+from locks import ReadWriteLock
+from persistence import SnapshotWriter, atomic_write, snapshot_paths
+from history import HistoryArchive
+from models import DeletedReminder, Reminder, from_epoch, to_epoch
+import metrics
 
 logging.basicConfig(
     level=logging.INFO,
@@ -14,168 +22,581 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class JSONDatabase:
-    def __init__(self, file_path: str = 'data.json'):
+class JSONDatabase(StorageBackend):
+    def __init__(self, file_path: str = 'data.json', journal: bool = False, compact_every: int = 1000,
+                 save_delay: float = 1.0, snapshots: int = 3, read_only: bool = False):
+        super().__init__()
         self.file_path = file_path
+        # Только чтение (перенос, проверки): снимок и журнал проигрываются в память, файлы не меняются
+        self.read_only = read_only
+        # В режиме журнала изменения дописываются в WAL, а не переписывают весь файл
+        self.journal = journal
+        self.wal_path = file_path + '.wal'
+        self.compact_every = compact_every
+        # Сколько предыдущих снимков хранить рядом с основным файлом (file.1 … file.N)
+        self.snapshots = snapshots
+        # Читатели не мешают друг другу, изменения сериализуются; внутренние словари
+        # при изменении заменяются целиком, поэтому поверхностная копия — согласованный снимок
+        self._rw = ReadWriteLock()
+        self._compact_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._wal = None
+        self._wal_records = 0
+        # В памяти напоминания — компактные Reminder с ключами int и сроками в секундах эпохи;
+        # в JSON-вид они переводятся только при чтении и записи файлов
         self.data = {
             'users': {},
             'reminders': {},
-            'deleted_reminders': [],
             'last_reminder_id': 0
         }
+        # История удаленных живет в отдельном архиве по суткам и не переписывается вместе со снимком.
+        # Записи истории попадают в файлы только после самого удаления (в снимке или журнале):
+        # иначе после сбоя напоминание вернулось бы, уже числясь в истории, и повторное удаление задвоило бы его
+        self.history = HistoryArchive(file_path + '.history')
+        # Вторичные индексы в памяти, поддерживаются в _apply
+        self._user_index: Dict[int, List[Tuple[int, int]]] = {}  # user_id -> [(-priority, id)]
+        self._expiry_index: List[Tuple[int, int]] = []  # [(expires_at, id)] по возрастанию
         self.load_data()
+        # Без журнала полная запись уходит в фоновый поток и объединяет серию изменений
+        self._writer = (
+            SnapshotWriter(self.save_data, save_delay) if not journal and not read_only and save_delay > 0 else None
+        )
         
     def load_data(self) -> None:
-        """Загружает данные из JSON файла"""
+        """Загружает данные из JSON файла и проигрывает журнал изменений"""
+        wal_paths = (self.wal_path + '.old', self.wal_path)
         try:
-            if os.path.exists(self.file_path):
-                with open(self.file_path, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
-                logger.info("Данные успешно загружены из JSON файла")
+            self._read_snapshot()
+            self._rebuild_indexes()
+            # Журнал проигрывается и без DB_JOURNAL: его мог оставить прошлый запуск в режиме журнала,
+            # иначе изменения после последнего снимка пропали бы, а их ID выдались бы повторно
+            # (.old остается, если прошлое сжатие не успело записать снимок)
+            leftover = [path for path in wal_paths if os.path.exists(path)]
+            if leftover and not self.journal:
+                # Повторы удалений из журнала отсеет индекс уже загруженного архива
+                self.history.ensure_loaded()
+            for path in leftover:
+                self._replay(path)
         except Exception as e:
+            # Файлы на диске не трогаем: пустая база не должна затереть данные
             logger.error(f"Ошибка при загрузке данных: {e}")
-            self.save_data()
+            self._rebuild_indexes()
+            leftover = []
+        if leftover and not self.journal and not self.read_only:
+            # Без журнала его содержимое переносится в снимок, а сам журнал удаляется
+            if self.save_data():
+                for path in leftover:
+                    os.remove(path)
+                logger.info("Журнал прошлого запуска перенесен в снимок")
+        if self.journal and not self.read_only and self._wal is None:
+            self._wal = open(self.wal_path, 'a', encoding='utf-8')
+            # Удаления из журнала уже на диске: их история дописывается в архив (повторы отсеет load)
+            self.history.write_pending(self.history.pending_count())
 
-    def save_data(self) -> bool:
-        """Сохраняет данные в JSON файл"""
+    def _read_snapshot(self) -> None:
+        """Читает основной снимок, а если он поврежден — самую свежую из ротационных копий"""
+        for path in snapshot_paths(self.file_path, self.snapshots):
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    raw = json.load(f)
+                self.data = self._from_json(raw)
+                if raw.get('deleted_reminders'):
+                    # Снимок старого формата: история переносится в архив, повторы пропускаются
+                    self.history.ensure_loaded()
+                    self.history.append(DeletedReminder.from_dict(item) for item in raw['deleted_reminders'])
+                    logger.info(f"История из {path} перенесена в архив")
+                logger.info(f"Данные успешно загружены из {path}")
+                return
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"Снимок {path} поврежден: {e}")
+                if path == self.file_path and not self.read_only:
+                    # Откладываем испорченный файл в сторону, чтобы ротация его не затерла
+                    os.replace(path, f"{path}.corrupt-{datetime.now():%Y%m%d%H%M%S}")
+
+    @staticmethod
+    def _from_json(raw: Dict[str, Any]) -> Dict[str, Any]:
+        """Переводит содержимое файла во внутреннее представление"""
+        return {
+            'users': raw.get('users', {}),
+            'reminders': {
+                int(reminder_key): Reminder.from_dict(reminder)
+                for reminder_key, reminder in raw.get('reminders', {}).items()
+            },
+            'last_reminder_id': raw.get('last_reminder_id', 0)
+        }
+
+    @staticmethod
+    def _to_json(data: Dict[str, Any]) -> str:
+        """Сериализует снимок в формат data.json (история хранится в архиве отдельно)"""
+        return json.dumps({
+            'users': data['users'],
+            'reminders': {str(reminder_id): reminder.to_dict() for reminder_id, reminder in data['reminders'].items()},
+            'last_reminder_id': data['last_reminder_id']
+        }, indent=2, ensure_ascii=False, default=str)
+
+    def _replay(self, path: str) -> None:
+        """Применяет записи журнала поверх загруженного снимка"""
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Оборванная последняя строка после аварийного завершения
+                    logger.warning(f"Пропущена поврежденная запись журнала в {path}")
+                    continue
+                self._apply(record)
+                self._wal_records += 1
+        logger.info(f"Журнал {path} применен")
+
+    def _rebuild_indexes(self) -> None:
+        """Строит индексы по пользователям и срокам заново"""
+        self._user_index = {}
+        self._expiry_index = sorted(
+            (reminder.expires_at, reminder_id) for reminder_id, reminder in self.data['reminders'].items()
+        )
+        for reminder_id, reminder in self.data['reminders'].items():
+            self._user_index.setdefault(reminder.user_id, []).append((-reminder.priority, reminder_id))
+        for user_reminders in self._user_index.values():
+            user_reminders.sort()
+
+    def _index_reminder(self, reminder_id: int, reminder: Reminder) -> None:
+        insort(self._expiry_index, (reminder.expires_at, reminder_id))
+        insort(self._user_index.setdefault(reminder.user_id, []), (-reminder.priority, reminder_id))
+
+    def _unindex_reminder(self, reminder_id: int, reminder: Reminder) -> None:
+        key = (reminder.expires_at, reminder_id)
+        position = bisect_left(self._expiry_index, key)
+        # delete_old_reminders заранее срезает истекший префикс индекса одним вызовом
+        if position < len(self._expiry_index) and self._expiry_index[position] == key:
+            del self._expiry_index[position]
+        user_reminders = self._user_index[reminder.user_id]
+        del user_reminders[bisect_left(user_reminders, (-reminder.priority, reminder_id))]
+        if not user_reminders:
+            del self._user_index[reminder.user_id]
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        """Применяет одну запись изменения к данным (идемпотентно)"""
+        op = record['op']
+        if op == 'user':
+            # Слияние с прежними данными: повторный /start не сбрасывает настройки рассылки
+            previous = self.data['users'].get(record['id'], {})
+            self.data['users'][record['id']] = {**previous, **record['user']}
+        elif op == 'schedule':
+            user = self.data['users'].get(record['id'])
+            if user is not None:
+                self.data['users'][record['id']] = {
+                    **user,
+                    'delivery_time': record['delivery_time'],
+                    'timezone': record['timezone']
+                }
+        elif op == 'add':
+            reminder_id = int(record['id'])
+            previous = self.data['reminders'].get(reminder_id)
+            if previous is not None:
+                self._unindex_reminder(reminder_id, previous)
+            reminder = Reminder.from_dict(record['reminder'])
+            self.data['reminders'][reminder_id] = reminder
+            self._index_reminder(reminder_id, reminder)
+            self.data['last_reminder_id'] = max(self.data['last_reminder_id'], reminder_id)
+            self._emit('added', {'id': reminder_id, 'user_id': reminder.user_id,
+                                 'expires_at': from_epoch(reminder.expires_at)})
+        elif op == 'delete':
+            reminder_id = int(record['id'])
+            reminder = self.data['reminders'].pop(reminder_id, None)
+            if reminder is not None:
+                self._unindex_reminder(reminder_id, reminder)
+                self.history.append([DeletedReminder.from_dict(record['history'])])
+                self._emit('deleted', {'id': reminder_id, 'user_id': reminder.user_id})
+        elif op == 'purge':
+            # Отбрасываются целые сутки старше границы вместе с их файлами
+            for user_id in self.history.purge(datetime.fromisoformat(record['before']).date()):
+                self._emit('purged', {'user_id': user_id})
+
+    def _apply_and_log(self, *records: Dict[str, Any]) -> bool:
+        """Применяет изменения и пишет их в журнал; вызывается под блокировкой записи"""
+        for record in records:
+            self._apply(record)
+        if not self.journal:
+            return True
+        # Запись в журнал под той же блокировкой сохраняет порядок применения
+        try:
+            for record in records:
+                self._wal.write(json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + '\n')
+            self._wal.flush()
+            self._wal_records += len(records)
+            # История удаленных дописывается только после записи удалений в журнал
+            self.history.write_pending(self.history.pending_count())
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при записи в журнал: {e}")
+            return False
+
+    def _after_commit(self, logged: bool) -> bool:
+        """Сохраняет изменения после снятия блокировки записи"""
+        if not self.journal:
+            if self._writer is not None:
+                self._writer.mark_dirty()
+                return True
+            return self.save_data()
+        if self._wal_records >= self.compact_every and not self._compact_lock.locked():
+            threading.Thread(target=self._compact, daemon=True).start()
+        return logged
+
+    def _commit(self, *records: Dict[str, Any]) -> bool:
+        """Применяет изменения и сохраняет их: в журнал или полной перезаписью"""
+        with self._rw.write():
+            logged = self._apply_and_log(*records)
+        return self._after_commit(logged)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Согласованная копия данных для долгих обходов и сериализации без блокировки"""
+        with self._rw.read():
+            return {
+                'users': dict(self.data['users']),
+                'reminders': dict(self.data['reminders']),
+                'last_reminder_id': self.data['last_reminder_id']
+            }
+
+    def _compact(self) -> bool:
+        """Сворачивает журнал в новый снимок"""
+        with self._compact_lock:
+            old_path = self.wal_path + '.old'
+            with self._rw.write():
+                snapshot = self.snapshot()
+                self._wal.close()
+                if os.path.exists(old_path):
+                    # Прошлое сжатие не завершилось: дописываем журнал к старому
+                    with open(self.wal_path, 'r', encoding='utf-8') as src, \
+                            open(old_path, 'a', encoding='utf-8') as dst:
+                        dst.write(src.read())
+                    os.remove(self.wal_path)
+                else:
+                    os.replace(self.wal_path, old_path)
+                self._wal = open(self.wal_path, 'a', encoding='utf-8')
+                self._wal_records = 0
+            # Сериализация и запись идут без блокировки, новые изменения уже попадают в свежий журнал
+            payload = self._to_json(snapshot)
+            if not self._write_snapshot(payload):
+                return False
+            os.remove(old_path)
+            logger.info("Журнал свернут в снимок")
+            return True
+
+    def _write_snapshot(self, payload: str) -> bool:
         try:
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False, default=str)
+            with metrics.SAVE_SECONDS.time():
+                atomic_write(self.file_path, payload, self.snapshots)
+            metrics.SAVE_BYTES.observe(len(payload.encode('utf-8')))
             return True
         except Exception as e:
             logger.error(f"Ошибка при сохранении данных: {e}")
             return False
 
+    def save_data(self) -> bool:
+        """Сохраняет данные в JSON файл"""
+        if self.read_only:
+            return False
+        if self.journal and self._wal is not None:
+            return self._compact()
+        # Снимок берется под блокировкой сохранения, поэтому более новое состояние не перезапишется старым
+        with self._save_lock:
+            # Отложенная история забирается вместе со снимком и пишется только после него
+            with self._rw.write():
+                snapshot = self.snapshot()
+                history = self.history.pending_count()
+            try:
+                payload = self._to_json(snapshot)
+            except Exception as e:
+                logger.error(f"Ошибка при сохранении данных: {e}")
+                return False
+            if not self._write_snapshot(payload):
+                return False
+            self.history.write_pending(history)
+            return True
+
     def add_user(self, user_id: int, username: str, first_name: str, last_name: str) -> bool:
         """Добавляет пользователя"""
-        self.data['users'][str(user_id)] = {
-            'username': username,
-            'first_name': first_name,
-            'last_name': last_name,
-            'registered_at': datetime.now().isoformat()
-        }
-        return self.save_data()
+        return self._commit({
+            'op': 'user',
+            'id': str(user_id),
+            'user': {
+                'username': username,
+                'first_name': first_name,
+                'last_name': last_name,
+                'registered_at': datetime.now().isoformat()
+            }
+        })
 
     def add_reminder(self, user_id: int, text: str, priority: int, days: int) -> Optional[int]:
         """Добавляет напоминание и возвращает его ID"""
-        reminder_id = self.data['last_reminder_id'] + 1
-        expires_at = datetime.now() + timedelta(days=days)
-        
-        self.data['reminders'][str(reminder_id)] = {
-            'user_id': user_id,
-            'text': text,
-            'priority': priority,
-            'created_at': datetime.now().isoformat(),
-            'expires_at': expires_at.isoformat(),
-            'is_completed': False
-        }
-        self.data['last_reminder_id'] = reminder_id
-        
-        if self.save_data():
-            return reminder_id
+        reminder_ids = self.add_reminders(user_id, [(text, priority, days)])
+        return reminder_ids[0] if reminder_ids else None
+
+    def add_reminders(self, user_id: int, items: List[Tuple[str, int, int]]) -> Optional[List[int]]:
+        """Добавляет пачку напоминаний одной транзакцией и одной записью на диск"""
+        now = datetime.now()
+        with self._rw.write():
+            # Выделение ID атомарно: счетчик сдвигается под блокировкой записи
+            first_id = self.data['last_reminder_id'] + 1
+            records = [
+                {
+                    'op': 'add',
+                    'id': str(first_id + offset),
+                    'reminder': {
+                        'user_id': user_id,
+                        'text': text,
+                        'priority': priority,
+                        'created_at': now.isoformat(),
+                        'expires_at': (now + timedelta(days=days)).isoformat(),
+                        'is_completed': False
+                    }
+                }
+                for offset, (text, priority, days) in enumerate(items)
+            ]
+            logged = self._apply_and_log(*records)
+
+        if self._after_commit(logged):
+            return list(range(first_id, first_id + len(records)))
         return None
 
+    def get_reminder(self, reminder_id: int) -> Optional[Dict[str, Any]]:
+        """Возвращает активное напоминание по ID"""
+        with self._rw.read():
+            reminder = self.data['reminders'].get(reminder_id)
+        if reminder is None:
+            return None
+        return {
+            'id': reminder_id,
+            'user_id': reminder.user_id,
+            'text': reminder.text,
+            'priority': reminder.priority,
+            'created_at': from_epoch(reminder.created_at),
+            'expires_at': from_epoch(reminder.expires_at),
+            'is_completed': reminder.is_completed
+        }
+
+    def get_reminder_expiries(self, after: datetime) -> List[Tuple[int, datetime]]:
+        """Возвращает (id, срок) напоминаний со сроком не раньше after"""
+        with self._rw.read():
+            lo = bisect_left(self._expiry_index, (to_epoch(after),))
+            return [(reminder_id, from_epoch(expires_at)) for expires_at, reminder_id in self._expiry_index[lo:]]
+
     def get_today_reminders(self, user_id: int) -> List[Dict[str, Any]]:
         """Возвращает все активные напоминания пользователя (не только на сегодня)"""
-        now = datetime.now()
+        now = to_epoch(datetime.now())
         result = []
         
-        for reminder_id, reminder in self.data['reminders'].items():
-            if (reminder['user_id'] == user_id and 
-                datetime.fromisoformat(reminder['expires_at']) >= now and 
-                not reminder['is_completed']):
-                result.append({
-                    'id': int(reminder_id),
-                    'text': reminder['text'],
-                    'priority': reminder['priority']
-                })
+        # Индекс пользователя уже упорядочен по убыванию приоритета
+        with self._rw.read():
+            for _, reminder_id in self._user_index.get(user_id, ()):
+                reminder = self.data['reminders'][reminder_id]
+                if reminder.expires_at >= now and not reminder.is_completed:
+                    result.append({
+                        'id': reminder_id,
+                        'text': reminder.text,
+                        'priority': reminder.priority,
+                        'expires_at': from_epoch(reminder.expires_at)
+                    })
         
-        return sorted(result, key=lambda x: x['priority'], reverse=True)
+        return result
     
+    def get_reminders_page(self, user_id: int, offset: int = 0,
+                           limit: int = 10) -> Tuple[List[Dict[str, Any]], bool]:
+        """Возвращает страницу активных напоминаний и признак следующей страницы"""
+        now = to_epoch(datetime.now())
+        result = []
+        skipped = 0
+
+        with self._rw.read():
+            for _, reminder_id in self._user_index.get(user_id, ()):
+                reminder = self.data['reminders'][reminder_id]
+                # В индексе могут быть истекшие, но еще не убранные очисткой: они не занимают место на странице
+                if reminder.expires_at < now or reminder.is_completed:
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                if len(result) == limit:
+                    return result, True
+                result.append({
+                    'id': reminder_id,
+                    'text': reminder.text,
+                    'priority': reminder.priority,
+                    'expires_at': from_epoch(reminder.expires_at)
+                })
+
+        return result, False
+
     def get_current_day_reminders(self, user_id: int) -> List[Dict[str, Any]]:
         """Возвращает напоминания, срок которых истекает сегодня"""
-        today = datetime.now().date()
-        tomorrow = today + timedelta(days=1)
+        today = to_epoch(datetime.combine(datetime.now().date(), datetime.min.time()))
+        tomorrow = to_epoch(datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time()))
         result = []
         
-        for reminder_id, reminder in self.data['reminders'].items():
-            expires_at = datetime.fromisoformat(reminder['expires_at']).date()
-            if (reminder['user_id'] == user_id and 
-                today <= expires_at < tomorrow and 
-                not reminder['is_completed']):
-                result.append({
-                    'id': int(reminder_id),
-                    'text': reminder['text'],
-                    'priority': reminder['priority']
-                })
+        with self._rw.read():
+            for _, reminder_id in self._user_index.get(user_id, ()):
+                reminder = self.data['reminders'][reminder_id]
+                if today <= reminder.expires_at < tomorrow and not reminder.is_completed:
+                    result.append({
+                        'id': reminder_id,
+                        'text': reminder.text,
+                        'priority': reminder.priority
+                    })
+        
+        return result
+
+    def get_due_reminders_by_user(self, start: datetime, end: datetime) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """Возвращает напоминания со сроком в [start, end), сгруппированные по пользователям"""
+        # Один проход по срезу индекса сроков вместо обхода всех напоминаний на каждого пользователя
+        # Группы собираются под блокировкой чтения, а отдаются уже без нее
+        groups: Dict[int, List[Tuple[int, int, str]]] = {}
+        with self._rw.read():
+            lo = bisect_left(self._expiry_index, (to_epoch(start),))
+            hi = bisect_left(self._expiry_index, (to_epoch(end),))
+            for _, reminder_id in self._expiry_index[lo:hi]:
+                reminder = self.data['reminders'][reminder_id]
+                if not reminder.is_completed:
+                    groups.setdefault(reminder.user_id, []).append(
+                        (-reminder.priority, reminder_id, reminder.text)
+                    )
         
-        return sorted(result, key=lambda x: x['priority'], reverse=True)
+        for user_id, keys in groups.items():
+            keys.sort()
+            yield user_id, [
+                {'id': reminder_id, 'text': text, 'priority': -neg_priority}
+                for neg_priority, reminder_id, text in keys
+            ]
 
     def get_all_users(self) -> List[int]:
         """Возвращает список всех пользователей"""
-        return [int(user_id) for user_id in self.data['users'].keys()]
+        with self._rw.read():
+            return [int(user_id) for user_id in self.data['users'].keys()]
+
+    def set_user_schedule(self, user_id: int, delivery_time: Optional[str], timezone: Optional[str]) -> bool:
+        """Задает время ежедневной рассылки пользователя"""
+        with self._rw.write():
+            if str(user_id) not in self.data['users']:
+                return False
+            logged = self._apply_and_log({
+                'op': 'schedule',
+                'id': str(user_id),
+                'delivery_time': delivery_time,
+                'timezone': timezone
+            })
+        return self._after_commit(logged)
+
+    def get_user_schedules(self) -> Dict[int, Tuple[str, Optional[str]]]:
+        """Возвращает пользователей со своим временем рассылки"""
+        users = self.snapshot()['users']
+        return {
+            int(user_id): (user['delivery_time'], user.get('timezone'))
+            for user_id, user in users.items()
+            if user.get('delivery_time')
+        }
 
     def delete_reminder(self, reminder_id: int, user_id: int, reason: str = "Пользователь удалил") -> bool:
         """Удаляет напоминание с сохранением в истории"""
-        reminder_key = str(reminder_id)
-        if reminder_key not in self.data['reminders']:
-            return False
-            
-        reminder = self.data['reminders'][reminder_key]
-        if reminder['user_id'] != user_id:
-            return False
-            
-        self.data['deleted_reminders'].append({
-            'original_id': reminder_id,
-            'user_id': user_id,
-            'text': reminder['text'],
-            'priority': reminder['priority'],
-            'created_at': reminder['created_at'],
-            'deleted_at': datetime.now().isoformat(),
-            'reason': reason
-        })
-        
-        del self.data['reminders'][reminder_key]
-        
-        return self.save_data()
+        return bool(self.delete_reminders([reminder_id], user_id, reason))
+
+    def delete_reminders(self, reminder_ids: List[int], user_id: int,
+                         reason: str = "Пользователь удалил") -> List[int]:
+        """Удаляет несколько напоминаний одной транзакцией и одной записью на диск"""
+        with self._rw.write():
+            records = []
+            deleted = []
+            for reminder_id in dict.fromkeys(reminder_ids):
+                reminder = self.data['reminders'].get(reminder_id)
+                if reminder is None or reminder.user_id != user_id:
+                    continue
+                records.append(self._delete_record(reminder_id, reminder, reason))
+                deleted.append(reminder_id)
+            if not records:
+                return []
+            logged = self._apply_and_log(*records)
+        return deleted if self._after_commit(logged) else []
+
+    def _delete_record(self, reminder_id: int, reminder: Reminder, reason: str) -> Dict[str, Any]:
+        return {
+            'op': 'delete',
+            'id': str(reminder_id),
+            'history': {
+                'original_id': reminder_id,
+                'user_id': reminder.user_id,
+                'text': reminder.text,
+                'priority': reminder.priority,
+                'created_at': from_epoch(reminder.created_at).isoformat(),
+                'deleted_at': datetime.now().isoformat(),
+                'reason': reason
+            }
+        }
 
     def get_deleted_reminders(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
         """Возвращает историю удаленных напоминаний"""
-        user_deleted = [
-            r for r in self.data['deleted_reminders'] 
-            if r['user_id'] == user_id
-        ]
-        user_deleted.sort(key=lambda x: x['deleted_at'], reverse=True)
-        return user_deleted[:limit]
-
-    def delete_old_reminders(self) -> bool:
-        """Удаляет старые напоминания и чистит историю"""
+        return self.get_deleted_page(user_id, limit)[0]
+
+    def get_deleted_page(self, user_id: int, limit: int = 10, cursor: Optional[str] = None,
+                         newer: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+        """Возвращает страницу истории и курсоры соседних страниц"""
+        with self._rw.read():
+            items, older_cursor, newer_cursor = self.history.page(user_id, limit, cursor, newer)
+        return [item.to_view() for item in items], older_cursor, newer_cursor
+
+    def delete_old_reminders(self, limit: Optional[int] = None) -> bool:
+        """Удаляет не больше limit истекших напоминаний и отбрасывает историю старше 30 дней"""
         now = datetime.now()
         month_ago = now - timedelta(days=30)
         
-        for reminder_id, reminder in list(self.data['reminders'].items()):
-            expires_at = datetime.fromisoformat(reminder['expires_at'])
-            if expires_at < now:
-                self.data['deleted_reminders'].append({
-                    'original_id': int(reminder_id),
-                    'user_id': reminder['user_id'],
-                    'text': reminder['text'],
-                    'priority': reminder['priority'],
-                    'created_at': reminder['created_at'],
-                    'deleted_at': datetime.now().isoformat(),
-                    'reason': 'Автоматическое удаление (истек срок)'
-                })
-                del self.data['reminders'][reminder_id]
+        with self._rw.write():
+            # Истекшие напоминания лежат в начале индекса сроков и снимаются оттуда по порядку
+            count = bisect_left(self._expiry_index, (to_epoch(now),))
+            if limit is not None:
+                count = min(count, limit)
+            expired = self._expiry_index[:count]
+            del self._expiry_index[:count]
+            records = [
+                self._delete_record(reminder_id, self.data['reminders'][reminder_id],
+                                    'Автоматическое удаление (истек срок)')
+                for _, reminder_id in expired
+            ]
+            oldest_day = self.history.oldest_day()
+            if oldest_day is not None and oldest_day < month_ago.toordinal():
+                records.append({'op': 'purge', 'before': month_ago.isoformat()})
+            if not records:
+                return True
+            logged = self._apply_and_log(*records)
         
-        self.data['deleted_reminders'] = [
-            r for r in self.data['deleted_reminders']
-            if datetime.fromisoformat(r['deleted_at']) >= month_ago
-        ]
-        
-        logger.info("Очистка старых напоминаний выполнена")
+        logger.info(f"Очистка: удалено истекших напоминаний — {len(expired)}")
+        return self._after_commit(logged)
+
+    def flush(self) -> bool:
+        """Дожидается записи на диск всех накопленных изменений"""
+        if self._writer is not None:
+            return self._writer.flush()
+        if self.journal:
+            with self._rw.write():
+                if self._wal is not None:
+                    self._wal.flush()
+                    os.fsync(self._wal.fileno())
+                self.history.sync()
+            return True
         return self.save_data()
 
     def close(self) -> None:
-        """Закрывает соединение (для совместимости)"""
-        self.save_data()
-        logger.info("Данные сохранены при закрытии")
\ No newline at end of file
+        """Сохраняет данные и закрывает журнал"""
+        if self.read_only:
+            return
+        if self._writer is not None:
+            self._writer.stop()
+        else:
+            self.save_data()
+        with self._rw.write():
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+            self.history.sync()
+            self.history.close()
+        logger.info("Данные сохранены при закрытии")
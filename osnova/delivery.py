@@ -0,0 +1,219 @@
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Ограничения Telegram: около 30 сообщений в секунду всего и 1 в секунду в один чат
+GLOBAL_RATE = 30.0
+PER_CHAT_RATE = 1.0
+
+# С какого числа ведер по чатам начинать выбрасывать простаивающие
+CHAT_BUCKETS_SWEEP = 1024
+
+# Коды ошибок, при которых повтор бесполезен (бот заблокирован, чат не найден и т.п.)
+PERMANENT_ERRORS = {400, 403}
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Забирает токен и возвращает, сколько секунд нужно подождать до отправки"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def idle(self) -> bool:
+        """Ведро успело наполниться: оно ничем не отличается от нового и его можно выбросить"""
+        with self._lock:
+            return self._tokens + (time.monotonic() - self._updated) * self.rate >= self.capacity
+
+
+@dataclass
+class DeliveryStats:
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    duration: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, ok: bool, retries: int) -> None:
+        with self._lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self.retried += retries
+        metrics.DELIVERY_MESSAGES.inc(result='sent' if ok else 'failed')
+        if retries:
+            metrics.DELIVERY_RETRIES.inc(retries)
+
+    def summary(self) -> str:
+        return (f"отправлено: {self.sent}, ошибок: {self.failed}, "
+                f"повторов: {self.retried}, время: {self.duration:.1f} с")
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Возвращает retry_after из ответа 429 Telegram, если он есть"""
+    if getattr(error, 'error_code', None) != 429:
+        return None
+    result = getattr(error, 'result_json', None) or {}
+    return float(result.get('parameters', {}).get('retry_after', 1))
+
+
+class DeliveryEngine:
+    """Рассылает сообщения пулом потоков с ограничением скорости и повторами"""
+
+    def __init__(self, send: Callable[[int, str], Any], workers: int = 8,
+                 global_rate: float = GLOBAL_RATE, per_chat_rate: float = PER_CHAT_RATE,
+                 max_retries: int = 3, backoff: float = 1.0):
+        self.send = send
+        self.workers = workers
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._chat_lock = threading.Lock()
+        # Порог следующей чистки простаивающих ведер: долгоживущий движок уведомлений
+        # вызывает только deliver() и иначе копил бы ведро на каждый чат
+        self._sweep_at = CHAT_BUCKETS_SWEEP
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        with self._chat_lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                if len(self._chat_buckets) >= self._sweep_at:
+                    self._sweep_idle_buckets()
+                bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, 1)
+            return bucket
+
+    def _sweep_idle_buckets(self) -> None:
+        """Выбрасывает наполнившиеся ведра; вызывается под _chat_lock"""
+        self._chat_buckets = {
+            chat_id: bucket for chat_id, bucket in self._chat_buckets.items() if not bucket.idle()
+        }
+        # Порог растет вместе с числом занятых ведер, поэтому чистка в среднем O(1) на вызов
+        self._sweep_at = max(CHAT_BUCKETS_SWEEP, 2 * len(self._chat_buckets))
+
+    def _retry_delay(self, chat_id: int, error: Exception, attempt: int) -> Optional[float]:
+        """Пауза перед повтором или None, если повторять не нужно"""
+        if getattr(error, 'error_code', None) in PERMANENT_ERRORS or attempt == self.max_retries:
+            logger.error(f"Ошибка при отправке пользователю {chat_id}: {error}")
+            return None
+        delay = retry_after(error)
+        if delay is None:
+            delay = self.backoff * 2 ** attempt
+        logger.warning(f"Повтор отправки пользователю {chat_id} через {delay:.1f} с: {error}")
+        return delay
+
+    def deliver(self, chat_id: int, text: str) -> Tuple[bool, int]:
+        """Отправляет одно сообщение; возвращает (успех, число повторов)"""
+        for attempt in range(self.max_retries + 1):
+            self._chat_bucket(chat_id).acquire()
+            self.global_bucket.acquire()
+            try:
+                self.send(chat_id, text)
+                return True, attempt
+            except Exception as e:
+                delay = self._retry_delay(chat_id, e, attempt)
+                if delay is None:
+                    return False, attempt
+                time.sleep(delay)
+        return False, self.max_retries
+
+    def run(self, jobs: Iterable[Tuple[int, str]]) -> DeliveryStats:
+        """Рассылает пары (chat_id, текст) и возвращает статистику"""
+        stats = DeliveryStats()
+        # Ограничиваем число задач в очереди, чтобы не держать всю рассылку в памяти
+        slots = threading.BoundedSemaphore(self.workers * 2)
+
+        def task(chat_id: int, text: str) -> None:
+            try:
+                stats.record(*self.deliver(chat_id, text))
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='delivery') as pool:
+            for chat_id, text in jobs:
+                slots.acquire()
+                pool.submit(task, chat_id, text)
+
+        stats.duration = time.monotonic() - stats.started_at
+        self._chat_buckets.clear()
+        return stats
+
+
+class AsyncDeliveryEngine(DeliveryEngine):
+    """Та же рассылка для asyncio: send — корутина, ожидание лимитов через asyncio.sleep"""
+
+    async def deliver_async(self, chat_id: int, text: str) -> Tuple[bool, int]:
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(self._chat_bucket(chat_id).reserve())
+            await asyncio.sleep(self.global_bucket.reserve())
+            try:
+                await self.send(chat_id, text)
+                return True, attempt
+            except Exception as e:
+                delay = self._retry_delay(chat_id, e, attempt)
+                if delay is None:
+                    return False, attempt
+                await asyncio.sleep(delay)
+        return False, self.max_retries
+
+    async def run_async(self, jobs: Iterable[Tuple[int, str]]) -> DeliveryStats:
+        """Рассылает пары (chat_id, текст) силами workers корутин.
+
+        jobs перебирается в отдельном потоке: генератор может читать хранилище,
+        а ограниченная очередь держит в памяти не больше workers * 2 сообщений.
+        """
+        stats = DeliveryStats()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        loop = asyncio.get_running_loop()
+
+        def feed() -> None:
+            for job in jobs:
+                asyncio.run_coroutine_threadsafe(queue.put(job), loop).result()
+
+        async def worker() -> None:
+            while True:
+                job = await queue.get()
+                if job is None:
+                    return
+                stats.record(*await self.deliver_async(*job))
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            await asyncio.to_thread(feed)
+        finally:
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+        stats.duration = time.monotonic() - stats.started_at
+        self._chat_buckets.clear()
+        return stats
@@ -0,0 +1,106 @@
+"""Состояние многошаговых диалогов (добавление напоминания).
+
+Вместо замыканий register_next_step_handler состояние чата — это шаг конечного
+автомата и небольшой словарь данных. Брошенные диалоги истекают через ttl
+секунд. Если задан path, состояние переживает перезапуск: оно сохраняется
+в отдельный JSON файл фоновой записью, как и основной снимок.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+from persistence import SnapshotWriter, atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Шаги диалога добавления: какой ответ пользователя ожидается следующим
+STEP_TEXT = 'text'
+STEP_PRIORITY = 'priority'
+STEP_DAYS = 'days'
+
+
+class DialogStore:
+    def __init__(self, ttl: float = 900, path: Optional[str] = None, save_delay: float = 1.0):
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._states: Dict[int, Tuple[str, Dict[str, Any], float]] = {}  # chat_id -> (шаг, данные, срок)
+        self._writer = None
+        if path:
+            self._load()
+            self._writer = SnapshotWriter(self._save, save_delay)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+        except ValueError as e:
+            logger.error(f"Файл диалогов {self.path} поврежден: {e}")
+            return
+        now = time.time()
+        self._states = {
+            int(chat_id): (step, data, expires_at)
+            for chat_id, (step, data, expires_at) in raw.items()
+            if expires_at > now
+        }
+        logger.info(f"Восстановлено незавершенных диалогов: {len(self._states)}")
+
+    def _save(self) -> bool:
+        with self._lock:
+            payload = json.dumps(self._states, ensure_ascii=False)
+        try:
+            atomic_write(self.path, payload, keep=0)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении диалогов: {e}")
+            return False
+
+    def _changed(self) -> None:
+        if self._writer is not None:
+            self._writer.mark_dirty()
+
+    def get(self, chat_id: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Текущий шаг и данные диалога или None"""
+        with self._lock:
+            state = self._states.get(chat_id)
+            if state is None:
+                return None
+            if state[2] > time.time():
+                return state[0], state[1]
+            del self._states[chat_id]
+        self._changed()
+        return None
+
+    def set(self, chat_id: int, step: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """Переводит диалог на шаг step; срок жизни отсчитывается заново"""
+        with self._lock:
+            self._states[chat_id] = (step, data or {}, time.time() + self.ttl)
+        self._changed()
+
+    def pop(self, chat_id: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Забирает состояние: ответ пользователя завершает текущий шаг"""
+        state = self.get(chat_id)
+        if state is not None:
+            with self._lock:
+                self._states.pop(chat_id, None)
+            self._changed()
+        return state
+
+    def evict_expired(self) -> int:
+        """Удаляет брошенные диалоги; вызывается периодической задачей планировщика"""
+        now = time.time()
+        with self._lock:
+            expired = [chat_id for chat_id, state in self._states.items() if state[2] <= now]
+            for chat_id in expired:
+                del self._states[chat_id]
+        if expired:
+            self._changed()
+        return len(expired)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.stop()
@@ -0,0 +1,85 @@
+"""Ежедневная рассылка: окна суток пользователей и задачи планировщика по слотам времени"""
+import os
+import logging
+from datetime import datetime, time as dt_time, timedelta
+from typing import Callable, Iterator, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+from views import format_daily_digest
+
+logger = logging.getLogger(__name__)
+
+# Время рассылки для пользователей, не задавших свое через /time
+DEFAULT_DELIVERY_TIME = dt_time(8, 0)
+
+# DIGEST_IN_PROCESS=0: рассылку в DEFAULT_DELIVERY_TIME и очистку выполняют процессы
+# shard_worker.py по cron, а бот эти задачи не регистрирует, иначе сводка уйдет дважды
+DIGEST_IN_PROCESS = os.getenv('DIGEST_IN_PROCESS', '1') != '0'
+
+
+def day_window(tz_name: Optional[str] = None) -> Tuple[datetime, datetime]:
+    """Границы текущих суток пользователя в локальном времени сервера"""
+    if not tz_name:
+        today = datetime.combine(datetime.now().date(), dt_time())
+        return today, today + timedelta(days=1)
+    zone = ZoneInfo(tz_name)
+    start = datetime.combine(datetime.now(zone).date(), dt_time(), tzinfo=zone)
+    end = start + timedelta(days=1)
+    return start.astimezone().replace(tzinfo=None), end.astimezone().replace(tzinfo=None)
+
+
+def daily_digests(db, tz_name: Optional[str] = None, include: Optional[Set[int]] = None,
+                  exclude: Set[int] = frozenset()) -> Iterator[Tuple[int, str]]:
+    """Готовит сообщения только для пользователей, у которых есть задачи на сегодня"""
+    start, end = day_window(tz_name)
+    for user_id, reminders in db.get_due_reminders_by_user(start, end):
+        if (include is not None and user_id not in include) or user_id in exclude:
+            continue
+        try:
+            yield user_id, format_daily_digest(reminders)
+        except Exception as e:
+            logger.error(f"Ошибка обработки пользователя {user_id}: {e}")
+
+
+def parse_delivery_time(args) -> Tuple[Optional[str], Optional[str]]:
+    """Разбирает аргументы /time: ('09:30', 'Europe/Moscow') или (None, None) для reset"""
+    if args[0] == 'reset':
+        return None, None
+    delivery_time = dt_time.fromisoformat(args[0]).strftime('%H:%M')
+    tz_name = args[1] if len(args) > 1 else None
+    if tz_name:
+        ZoneInfo(tz_name)
+    return delivery_time, tz_name
+
+
+def sync_digest_jobs(scheduler, db, send_digest: Callable[..., None]) -> None:
+    """Регистрирует задачу рассылки на каждое сочетание времени и часового пояса пользователей
+
+    send_digest(tz_name, include, exclude) выполняет рассылку для одного слота.
+    Без DIGEST_IN_PROCESS общий слот не регистрируется: его рассылает shard_worker.py,
+    а пользователей со своим временем он пропускает, поэтому их слоты остаются за ботом.
+    """
+    schedules = db.get_user_schedules()
+    slots = {}
+    for user_id, slot in schedules.items():
+        slots.setdefault(slot, set()).add(user_id)
+    custom_users = set(schedules)
+
+    if DIGEST_IN_PROCESS:
+        scheduler.add_daily(
+            'daily_digest',
+            lambda: send_digest(None, None, custom_users),
+            DEFAULT_DELIVERY_TIME
+        )
+    slot_jobs = set()
+    for (delivery_time, tz_name), users in slots.items():
+        name = f"daily_digest:{delivery_time}:{tz_name or ''}"
+        slot_jobs.add(name)
+        scheduler.add_daily(
+            name,
+            lambda tz_name=tz_name, users=users: send_digest(tz_name, users, frozenset()),
+            dt_time.fromisoformat(delivery_time),
+            tz_name
+        )
+    for name in scheduler.job_names():
+        if name.startswith('daily_digest:') and name not in slot_jobs:
+            scheduler.remove(name)
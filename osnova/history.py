@@ -0,0 +1,198 @@
+"""Архив истории удаленных напоминаний.
+
+История не входит в основной снимок data.json: записи дописываются в файлы
+<каталог>/ГГГГ-ММ-ДД.jsonl по дате удаления, поэтому рост истории не влияет
+на запись активных напоминаний, а очистка старше 30 дней удаляет файлы целиком.
+Файлы читаются лениво, при первом просмотре истории: запуск бота не ждет
+разбора архива, а новые записи до этого момента просто дописываются в файлы.
+
+Новые записи сначала копятся в очереди в памяти и попадают в файлы через
+write_pending, когда хранилище уже надежно записало само удаление (снимок
+без этих напоминаний или журнал изменений).
+"""
+import os
+import json
+import logging
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime
+from typing import Dict, IO, Iterable, List, Optional, Set, Tuple
+from models import DeletedReminder, from_epoch, to_epoch
+
+logger = logging.getLogger(__name__)
+
+# Ключ записи: (deleted_at, original_id) — уникален и задает порядок страниц
+Key = Tuple[int, int]
+
+
+def encode_cursor(key: Key) -> str:
+    return f"{key[0]}:{key[1]}"
+
+
+def decode_cursor(cursor: str) -> Key:
+    deleted_at, original_id = cursor.split(':')
+    return int(deleted_at), int(original_id)
+
+
+class HistoryArchive:
+    """Файлы истории по суткам и индекс по пользователям в памяти"""
+
+    def __init__(self, directory: str):
+        # Каталог создается при первой записи: чтение архива ничего не меняет на диске
+        self.directory = directory
+        self._pending: List[DeletedReminder] = []
+        self._items: Dict[Key, DeletedReminder] = {}
+        self._keys: Dict[int, List[Key]] = {}  # user_id -> ключи по возрастанию
+        self._days: Dict[int, List[Key]] = {}  # день (ordinal) -> ключи записей этого дня
+        self._files: Dict[int, IO[str]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _day_path(self, day: int) -> str:
+        return os.path.join(self.directory, f"{date.fromordinal(day).isoformat()}.jsonl")
+
+    def _file_days(self) -> List[int]:
+        """Дни, для которых есть файлы, по возрастанию"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            date.fromisoformat(name[:-len('.jsonl')]).toordinal()
+            for name in os.listdir(self.directory) if name.endswith('.jsonl')
+        )
+
+    def ensure_loaded(self) -> None:
+        """Загружает архив, если он еще не загружен; вызывается при первом просмотре истории"""
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self.load()
+
+    def load(self) -> None:
+        """Читает все файлы архива в индексы; повторы строк (после проигрывания журнала) пропускаются"""
+        for day in self._file_days():
+            path = self._day_path(day)
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self._add(DeletedReminder.from_dict(json.loads(line)))
+                    except (ValueError, KeyError):
+                        # Оборванная последняя строка после аварийного завершения
+                        logger.warning(f"Пропущена поврежденная запись истории в {path}")
+        for item in self._pending:
+            self._add(item)
+        self._loaded = True
+        logger.info(f"Архив истории загружен: {len(self._items)} записей")
+
+    def _add(self, item: DeletedReminder) -> Optional[int]:
+        """Добавляет запись в индексы и возвращает ее день; None — запись уже есть"""
+        key = (item.deleted_at, item.original_id)
+        if key in self._items:
+            return None
+        day = from_epoch(item.deleted_at).toordinal()
+        self._items[key] = item
+        insort(self._keys.setdefault(item.user_id, []), key)
+        self._days.setdefault(day, []).append(key)
+        return day
+
+    def append(self, items: Iterable[DeletedReminder]) -> None:
+        """Ставит записи в очередь на запись; повторы (проигрывание журнала) пропускаются"""
+        with self._lock:
+            # До загрузки индексов запись только ставится в очередь, повтор в файлах отсеет load
+            self._pending.extend(item for item in items if not self._loaded or self._add(item) is not None)
+
+    def pending_count(self) -> int:
+        """Сколько записей еще не попало в файлы"""
+        with self._lock:
+            return len(self._pending)
+
+    def write_pending(self, count: int) -> None:
+        """Дописывает в файлы первые count отложенных записей.
+
+        До записи они остаются в очереди, поэтому load в это время их не теряет.
+        """
+        with self._lock:
+            self._write(self._pending[:count])
+            del self._pending[:count]
+
+    def _write(self, items: Iterable[DeletedReminder]) -> None:
+        touched = set()
+        if not self._files:
+            os.makedirs(self.directory, exist_ok=True)
+        for item in items:
+            day = from_epoch(item.deleted_at).toordinal()
+            f = self._files.get(day)
+            if f is None:
+                f = self._files[day] = open(self._day_path(day), 'a', encoding='utf-8')
+            f.write(json.dumps(item.to_dict(), ensure_ascii=False, separators=(',', ':')) + '\n')
+            touched.add(f)
+        for f in touched:
+            f.flush()
+
+    def page(self, user_id: int, limit: int, cursor: Optional[str] = None,
+             newer: bool = False) -> Tuple[List[DeletedReminder], Optional[str], Optional[str]]:
+        """Записи пользователя от новых к старым: старше cursor или, при newer, новее него.
+
+        Кроме записей возвращает курсоры более старой и более новой страницы (None — страницы нет).
+        """
+        self.ensure_loaded()
+        keys = self._keys.get(user_id, [])
+        if newer and cursor is not None:
+            lo = bisect_right(keys, decode_cursor(cursor))
+            hi = min(len(keys), lo + limit)
+        else:
+            hi = len(keys) if cursor is None else bisect_left(keys, decode_cursor(cursor))
+            lo = max(0, hi - limit)
+        items = [self._items[key] for key in reversed(keys[lo:hi])]
+        older_cursor = encode_cursor(keys[lo]) if 0 < lo < hi else None
+        newer_cursor = encode_cursor(keys[hi - 1]) if lo < hi < len(keys) else None
+        return items, older_cursor, newer_cursor
+
+    def oldest_day(self) -> Optional[int]:
+        if not self._loaded:
+            days = self._file_days()
+            return days[0] if days else None
+        return min(self._days) if self._days else None
+
+    def purge(self, before: date) -> Set[int]:
+        """Удаляет дни раньше before вместе с их файлами и возвращает затронутых пользователей"""
+        cutoff = (to_epoch(datetime.combine(before, datetime.min.time())),)
+        users = set()
+        with self._lock:
+            days = self._days if self._loaded else self._file_days()
+            for day in [day for day in days if day < before.toordinal()]:
+                for key in self._days.pop(day, ()):
+                    users.add(self._items.pop(key).user_id)
+                f = self._files.pop(day, None)
+                if f is not None:
+                    f.close()
+                try:
+                    os.remove(self._day_path(day))
+                except FileNotFoundError:
+                    pass
+            for user_id in users:
+                keys = self._keys[user_id]
+                del keys[:bisect_left(keys, cutoff)]
+                if not keys:
+                    del self._keys[user_id]
+        return users
+
+    def __iter__(self):
+        self.ensure_loaded()
+        for day in sorted(self._days):
+            for key in self._days[day]:
+                yield self._items[key]
+
+    def __len__(self) -> int:
+        self.ensure_loaded()
+        return len(self._items)
+
+    def sync(self) -> None:
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files = {}
@@ -0,0 +1,261 @@
+"""Метрики горячих путей в текстовом формате Prometheus.
+
+Счетчики и гистограммы собираются в памяти всегда (это несколько операций
+под блокировкой), а HTTP-сервер запускается только при заданном METRICS_PORT
+и слушает локальный интерфейс:
+
+    /metrics         — все метрики
+    /profile/start   — включить сэмплирующий профилировщик
+    /profile/stop    — выключить и получить свернутые стеки (формат flamegraph)
+"""
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import Counter as StackCounter
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def _format_labels(self, key: LabelValues, extra: str = '') -> str:
+        pairs = [f'{label}="{value}"' for label, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def expose(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._format_labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self._values: Dict[LabelValues, List[float]] = {}  # [счетчики по корзинам..., сумма, количество]
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def time(self, **labels: str) -> '_Timer':
+        return _Timer(self, labels)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, counts in self._values.items():
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    bucket = self._format_labels(key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+                bucket = self._format_labels(key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket} {counts[-1]}")
+                lines.append(f"{self.name}_sum{self._format_labels(key)} {counts[-2]}")
+                lines.append(f"{self.name}_count{self._format_labels(key)} {counts[-1]}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> '_Timer':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self) -> str:
+        return '\n'.join(line for metric in self._metrics for line in metric.expose()) + '\n'
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.register(Histogram(
+    'bot_handler_seconds', 'Время обработки обновления обработчиком', ('handler',)))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    'bot_handler_errors_total', 'Исключения, вышедшие из обработчиков', ('handler',)))
+SAVE_SECONDS = REGISTRY.register(Histogram(
+    'storage_save_seconds', 'Длительность записи снимка хранилища'))
+SAVE_BYTES = REGISTRY.register(Histogram(
+    'storage_save_bytes', 'Размер записанного снимка хранилища', buckets=SIZE_BUCKETS))
+JOB_SECONDS = REGISTRY.register(Histogram(
+    'scheduler_job_seconds', 'Длительность задач планировщика', ('job',)))
+JOB_ERRORS = REGISTRY.register(Counter(
+    'scheduler_job_errors_total', 'Задачи планировщика, завершившиеся ошибкой', ('job',)))
+DELIVERY_MESSAGES = REGISTRY.register(Counter(
+    'delivery_messages_total', 'Сообщения рассылки по результату', ('result',)))
+DELIVERY_RETRIES = REGISTRY.register(Counter(
+    'delivery_retries_total', 'Повторные попытки отправки'))
+
+
+def instrument_handlers(bot) -> None:
+    """Оборачивает уже зарегистрированные обработчики бота замером времени и ошибок"""
+    for handlers in (bot.message_handlers, bot.callback_query_handlers):
+        for handler in handlers:
+            handler['function'] = _timed_handler(handler['function'])
+
+
+def _timed_handler(func: Callable) -> Callable:
+    name = func.__name__
+    if asyncio.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with HANDLER_SECONDS.time(handler=name):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    HANDLER_ERRORS.inc(handler=name)
+                    raise
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with HANDLER_SECONDS.time(handler=name):
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name)
+                raise
+    return wrapper
+
+
+class SamplingProfiler:
+    """Раз в interval секунд снимает стеки всех потоков и считает одинаковые"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self._stacks: StackCounter = StackCounter()
+        self._stop: Optional[threading.Event] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._stop is not None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._stop is not None:
+                return
+            self._stacks = StackCounter()
+            self._stop = threading.Event()
+            threading.Thread(target=self._run, args=(self._stop,), name='profiler', daemon=True).start()
+
+    def stop(self) -> str:
+        """Останавливает сбор и возвращает стеки в свернутом виде: «f1;f2;f3 count»"""
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+                self._stop = None
+            stacks = self._stacks
+        return '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common()) + '\n'
+
+    def _run(self, stop: threading.Event) -> None:
+        me = threading.get_ident()
+        while not stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = ';'.join(f"{entry.name} ({entry.filename}:{entry.lineno})"
+                                 for entry in traceback.extract_stack(frame))
+                self._stacks[stack] += 1
+
+
+PROFILER = SamplingProfiler()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = REGISTRY.expose(), 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path == '/profile/start':
+            PROFILER.start()
+            body, content_type = 'profiler started\n', 'text/plain; charset=utf-8'
+        elif self.path == '/profile/stop':
+            body, content_type = PROFILER.stop(), 'text/plain; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def start_http_server(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Запускает сервер метрик в фоновом потоке"""
+    httpd = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=httpd.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f"Метрики доступны на http://{host}:{httpd.server_address[1]}/metrics")
+    return httpd
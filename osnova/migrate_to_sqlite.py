@@ -0,0 +1,110 @@
+"""Однократный перенос данных из reminders_data.json в SQLite.
+
+Запуск: python migrate_to_sqlite.py [reminders_data.json] [reminders_data.sqlite3]
+
+Источник открывается через JSONDatabase только для чтения: журнал (.wal, .wal.old)
+проигрывается в памяти, история берется из архива, а сами файлы не меняются.
+В непустую базу перенос не выполняется, поэтому повторный запуск ничего не задваивает.
+"""
+import os
+import sys
+import logging
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+from database import JSONDatabase
+from sqlite_database import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+
+
+def _batches(rows: Iterable[Tuple], size: int) -> Iterator[List[Tuple]]:
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def migrate(json_path: str, sqlite_path: str, batch_size: int = BATCH_SIZE) -> None:
+    """Переносит пользователей, напоминания и историю пачками по batch_size строк"""
+    # Хранилище в режиме журнала до первого сжатия состоит только из .wal
+    if not any(os.path.exists(json_path + suffix) for suffix in ('', '.wal', '.wal.old')):
+        raise FileNotFoundError(json_path)
+    # Изменения после последнего сжатия есть только в .wal: он проигрывается при загрузке
+    source = JSONDatabase(json_path, read_only=True)
+    try:
+        snapshot = source.snapshot()
+        data = {
+            'users': snapshot['users'],
+            'reminders': {
+                reminder_id: reminder.to_dict() for reminder_id, reminder in snapshot['reminders'].items()
+            },
+            'last_reminder_id': snapshot['last_reminder_id']
+        }
+        # Снимок старого формата при загрузке уже перенес свою историю в архив
+        history = [item.to_dict() for item in source.history]
+    finally:
+        source.close()
+
+    db = SQLiteDatabase(sqlite_path)
+    conn = db.conn
+    try:
+        non_empty = conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM users) OR EXISTS (SELECT 1 FROM reminders) "
+            "OR EXISTS (SELECT 1 FROM deleted_reminders)"
+        ).fetchone()[0]
+        if non_empty:
+            raise RuntimeError(f"База {sqlite_path} не пуста: перенос уже выполнялся")
+        with conn:
+            for batch in _batches((
+                (int(user_id), user['username'], user['first_name'], user['last_name'],
+                 user['registered_at'], user.get('delivery_time'), user.get('timezone'))
+                for user_id, user in data['users'].items()
+            ), batch_size):
+                conn.executemany(
+                    "INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?, ?, ?)", batch
+                )
+
+            for batch in _batches((
+                (int(reminder_id), r['user_id'], r['text'], r['priority'],
+                 r['created_at'], r['expires_at'], int(r['is_completed']))
+                for reminder_id, r in data['reminders'].items()
+            ), batch_size):
+                conn.executemany(
+                    "INSERT OR REPLACE INTO reminders VALUES (?, ?, ?, ?, ?, ?, ?)", batch
+                )
+
+            for batch in _batches((
+                (r['original_id'], r['user_id'], r['text'], r['priority'],
+                 r['created_at'], r['deleted_at'], r['reason'])
+                for r in history
+            ), batch_size):
+                conn.executemany(
+                    "INSERT INTO deleted_reminders "
+                    "(original_id, user_id, text, priority, created_at, deleted_at, reason) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", batch
+                )
+
+            # ID удаленных напоминаний не должны выдаваться повторно
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = 'reminders'")
+            conn.execute(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES ('reminders', ?)",
+                (data['last_reminder_id'],)
+            )
+        logger.info(
+            f"Перенесено: пользователей {len(data['users'])}, "
+            f"напоминаний {len(data['reminders'])}, "
+            f"записей истории {len(history)}"
+        )
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    migrate(
+        sys.argv[1] if len(sys.argv) > 1 else 'reminders_data.json',
+        sys.argv[2] if len(sys.argv) > 2 else 'reminders_data.sqlite3'
+    )
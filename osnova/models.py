@@ -0,0 +1,116 @@
+from datetime import datetime
+from typing import Any, Dict
+
+# Один объект int на пользователя, сколько бы напоминаний у него ни было
+_user_ids: Dict[int, int] = {}
+
+
+def intern_user_id(user_id: int) -> int:
+    user_id = int(user_id)
+    return _user_ids.setdefault(user_id, user_id)
+
+
+def to_epoch(value: datetime) -> int:
+    return int(value.timestamp())
+
+
+def from_epoch(value: int) -> datetime:
+    return datetime.fromtimestamp(value)
+
+
+class Reminder:
+    """Активное напоминание в памяти: сроки хранятся секундами эпохи,
+    в ISO-строки они превращаются только при записи на диск"""
+
+    __slots__ = ('user_id', 'text', 'priority', 'created_at', 'expires_at', 'is_completed')
+
+    def __init__(self, user_id: int, text: str, priority: int, created_at: int, expires_at: int,
+                 is_completed: bool = False):
+        self.user_id = intern_user_id(user_id)
+        self.text = text
+        self.priority = priority
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.is_completed = is_completed
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Reminder':
+        return cls(
+            data['user_id'],
+            data['text'],
+            data['priority'],
+            to_epoch(datetime.fromisoformat(data['created_at'])),
+            to_epoch(datetime.fromisoformat(data['expires_at'])),
+            data.get('is_completed', False)
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, type(self)):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'user_id': self.user_id,
+            'text': self.text,
+            'priority': self.priority,
+            'created_at': from_epoch(self.created_at).isoformat(),
+            'expires_at': from_epoch(self.expires_at).isoformat(),
+            'is_completed': self.is_completed
+        }
+
+
+class DeletedReminder:
+    """Запись истории удаленных напоминаний"""
+
+    __slots__ = ('original_id', 'user_id', 'text', 'priority', 'created_at', 'deleted_at', 'reason')
+
+    def __init__(self, original_id: int, user_id: int, text: str, priority: int, created_at: int,
+                 deleted_at: int, reason: str):
+        self.original_id = original_id
+        self.user_id = intern_user_id(user_id)
+        self.text = text
+        self.priority = priority
+        self.created_at = created_at
+        self.deleted_at = deleted_at
+        self.reason = reason
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'DeletedReminder':
+        return cls(
+            data['original_id'],
+            data['user_id'],
+            data['text'],
+            data['priority'],
+            to_epoch(datetime.fromisoformat(data['created_at'])),
+            to_epoch(datetime.fromisoformat(data['deleted_at'])),
+            data['reason']
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, type(self)):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'original_id': self.original_id,
+            'user_id': self.user_id,
+            'text': self.text,
+            'priority': self.priority,
+            'created_at': from_epoch(self.created_at).isoformat(),
+            'deleted_at': from_epoch(self.deleted_at).isoformat(),
+            'reason': self.reason
+        }
+
+    def to_view(self) -> Dict[str, Any]:
+        """Словарь для обработчиков: сроки уже datetime, разбирать ничего не нужно"""
+        return {
+            'original_id': self.original_id,
+            'user_id': self.user_id,
+            'text': self.text,
+            'priority': self.priority,
+            'created_at': from_epoch(self.created_at),
+            'deleted_at': from_epoch(self.deleted_at),
+            'reason': self.reason
+        }
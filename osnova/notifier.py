@@ -0,0 +1,84 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiryNotifier:
+    """Мин-куча моментов уведомления и один спящий поток, который будит их вовремя"""
+
+    def __init__(self, fire: Callable[[int], None]):
+        self.fire = fire
+        self._heap: List[Tuple[float, int]] = []
+        # Актуальное время для каждого ID; записи кучи, не совпадающие с ним, считаются отмененными
+        self._pending: Dict[int, float] = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def load(self, items: Iterable[Tuple[int, datetime]]) -> None:
+        """Строит кучу из всех предстоящих напоминаний за O(n)"""
+        with self._cond:
+            self._pending = {reminder_id: expires_at.timestamp() for reminder_id, expires_at in items}
+            self._heap = [(ts, reminder_id) for reminder_id, ts in self._pending.items()]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+        logger.info(f"Запланировано уведомлений: {len(self._pending)}")
+
+    def schedule(self, reminder_id: int, when: datetime) -> None:
+        ts = when.timestamp()
+        with self._cond:
+            self._pending[reminder_id] = ts
+            heapq.heappush(self._heap, (ts, reminder_id))
+            # Будим поток, только если новое уведомление стало ближайшим
+            if self._heap[0] == (ts, reminder_id):
+                self._cond.notify()
+
+    def cancel(self, reminder_id: int) -> None:
+        with self._cond:
+            self._pending.pop(reminder_id, None)
+
+    def on_storage_event(self, event: str, reminder: Dict[str, Any]) -> None:
+        """Подписчик хранилища: держит кучу в соответствии с добавлениями и удалениями"""
+        if event == 'added':
+            self.schedule(reminder['id'], reminder['expires_at'])
+        elif event == 'deleted':
+            self.cancel(reminder['id'])
+
+    def _pop_due(self, now: float) -> List[int]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            ts, reminder_id = heapq.heappop(self._heap)
+            if self._pending.get(reminder_id) == ts:
+                del self._pending[reminder_id]
+                due.append(reminder_id)
+        return due
+
+    def run_forever(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                timeout = self._heap[0][0] - time.time() if self._heap else None
+                if timeout is None or timeout > 0:
+                    self._cond.wait(timeout)
+                    continue
+                due = self._pop_due(time.time())
+            for reminder_id in due:
+                try:
+                    self.fire(reminder_id)
+                except Exception as e:
+                    logger.error(f"Ошибка уведомления о напоминании {reminder_id}: {e}")
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run_forever, name='notifier', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
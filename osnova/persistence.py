@@ -0,0 +1,126 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_paths(path: str, keep: int) -> List[str]:
+    """Основной файл и его ротационные копии, от новой к старой"""
+    return [path] + [f"{path}.{i}" for i in range(1, keep + 1)]
+
+
+def _fsync_dir(path: str) -> None:
+    if os.name != 'posix':
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _preserve(path: str, target: str) -> None:
+    """Атомарно кладет в target содержимое path, не трогая сам path"""
+    link_path = f"{target}.tmp"
+    if os.path.exists(link_path):
+        os.remove(link_path)
+    try:
+        os.link(path, link_path)
+    except OSError:
+        # Файловая система без жестких ссылок
+        shutil.copy2(path, link_path)
+    os.replace(link_path, target)
+
+
+def atomic_write(path: str, payload: str, keep: int = 3) -> None:
+    """Пишет во временный файл, делает fsync и атомарно подменяет path.
+
+    Предыдущие версии сдвигаются в path.1 … path.<keep>; текущий файл попадает
+    в path.1 жесткой ссылкой (или копией), а не переносом, поэтому path не
+    пропадает ни на миг: при сбое в любой момент по этому имени лежит либо
+    старый, либо новый целый файл.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    paths = snapshot_paths(path, keep)
+    for older, newer in zip(reversed(paths[2:]), reversed(paths[1:-1])):
+        if os.path.exists(newer):
+            os.replace(newer, older)
+    if keep > 0 and os.path.exists(path):
+        _preserve(path, paths[1])
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+class SnapshotWriter:
+    """Фоновая запись снимков: изменения помечают данные грязными, а запись
+    выполняется не чаще раза в delay секунд и объединяет всю пачку изменений"""
+
+    def __init__(self, save: Callable[[], bool], delay: float = 1.0):
+        self.save = save
+        self.delay = delay
+        self._cond = threading.Condition()
+        self._dirty = False
+        # Фоновая запись идет прямо сейчас: flush должен ее дождаться
+        self._saving = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='snapshot-writer', daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self) -> None:
+        with self._cond:
+            self._dirty = True
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._dirty and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+            # Ждем окно дебаунса, чтобы серия нажатий превратилась в одну запись
+            time.sleep(self.delay)
+            with self._cond:
+                if self._stopped:
+                    return
+                self._dirty = False
+                self._saving = True
+            saved = False
+            try:
+                saved = self.save()
+            except Exception as e:
+                logger.error(f"Ошибка фоновой записи снимка: {e}")
+            finally:
+                with self._cond:
+                    self._saving = False
+                    # Неудачная запись повторится: следующей фоновой или явным flush
+                    if not saved:
+                        self._dirty = True
+                    self._cond.notify_all()
+
+    def flush(self) -> bool:
+        """Синхронно записывает накопленные изменения, дождавшись идущей фоновой записи"""
+        with self._cond:
+            while self._saving:
+                self._cond.wait()
+            if not self._dirty:
+                return True
+            self._dirty = False
+        return self.save()
+
+    def stop(self) -> bool:
+        """Записывает остаток изменений и останавливает поток"""
+        saved = self.flush()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+        return saved
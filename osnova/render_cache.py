@@ -0,0 +1,75 @@
+"""LRU-кэш готовых сообщений и клавиатур по пользователю и экрану.
+
+Запись сбрасывается событиями хранилища (добавление, удаление, автоудаление
+истекших, очистка старой истории) и сама устаревает в момент истечения самого раннего из показанных
+напоминаний, поэтому повторные нажатия «📋 Мои напоминания» не ходят в базу.
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# build() возвращает (значение, момент устаревания в секундах эпохи или None)
+Builder = Callable[[], Tuple[Any, Optional[float]]]
+
+
+def earliest_expiry(reminders) -> Optional[float]:
+    """Момент, когда показанный список устареет: истечение самого раннего напоминания"""
+    return min((reminder['expires_at'].timestamp() for reminder in reminders), default=None)
+
+
+class RenderCache:
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple[int, Hashable], Tuple[Any, Optional[float]]]' = OrderedDict()
+        self._keys_by_user: Dict[int, set] = {}
+        # Поколение пользователя растет при каждом сбросе: сборка, начатая до сброса, не попадет в кэш
+        self._generations: Dict[int, int] = {}
+
+    def get(self, user_id: int, view: Hashable, build: Builder) -> Any:
+        key = (user_id, view)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generations.get(user_id, 0)
+        # Сборка идет без блокировки: запрос к базе не должен задерживать других пользователей
+        value, valid_until = build()
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return value
+            self._entries[key] = (value, valid_until)
+            self._entries.move_to_end(key)
+            self._keys_by_user.setdefault(user_id, set()).add(view)
+            while len(self._entries) > self.maxsize:
+                (old_user, old_view), _ = self._entries.popitem(last=False)
+                self._forget(old_user, old_view)
+        return value
+
+    def _forget(self, user_id: int, view: Hashable) -> None:
+        views = self._keys_by_user.get(user_id)
+        if views is not None:
+            views.discard(view)
+            if not views:
+                del self._keys_by_user[user_id]
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for view in self._keys_by_user.pop(user_id, ()):
+                self._entries.pop((user_id, view), None)
+
+    def on_storage_event(self, event: str, reminder: Dict[str, Any]) -> None:
+        """Подписчик хранилища: любое изменение напоминаний или истории пользователя сбрасывает его экраны"""
+        self.invalidate(reminder['user_id'])
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0.0
+        return f"попаданий: {self.hits}, промахов: {self.misses} ({ratio:.0f}%), записей: {len(self._entries)}"
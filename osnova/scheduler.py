@@ -0,0 +1,206 @@
+import os
+import json
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, time as dt_time
+from itertools import count
+from typing import Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+import metrics
+from persistence import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class DailyAt:
+    """Расписание: каждый день в заданное время в часовом поясе tz (None — время сервера)"""
+
+    def __init__(self, at: dt_time, tz: Optional[str] = None):
+        self.at = at
+        self.tz = tz
+        self._zone = ZoneInfo(tz) if tz else None
+
+    def _occurrence(self, day) -> float:
+        moment = datetime.combine(day, self.at)
+        if self._zone is not None:
+            moment = moment.replace(tzinfo=self._zone)
+        return moment.timestamp()
+
+    def next_after(self, ts: float) -> float:
+        day = datetime.fromtimestamp(ts, self._zone).date()
+        candidate = self._occurrence(day)
+        if candidate <= ts:
+            candidate = self._occurrence(day + timedelta(days=1))
+        return candidate
+
+    def previous_before(self, ts: float) -> float:
+        day = datetime.fromtimestamp(ts, self._zone).date()
+        candidate = self._occurrence(day)
+        if candidate > ts:
+            candidate = self._occurrence(day - timedelta(days=1))
+        return candidate
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, DailyAt) and (self.at, self.tz) == (other.at, other.tz)
+
+
+class Every:
+    """Расписание: каждые seconds секунд"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def next_after(self, ts: float) -> float:
+        return ts + self.seconds
+
+    def previous_before(self, ts: float) -> float:
+        return ts - self.seconds
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Every) and self.seconds == other.seconds
+
+
+class Job:
+    def __init__(self, name: str, func: Callable[[], None], schedule, next_run: float):
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.next_run = next_run
+        self.running = False
+
+
+class Scheduler:
+    """Планировщик на куче: спит до ближайшей задачи и запоминает время последних запусков"""
+
+    def __init__(self, state_path: Optional[str] = 'scheduler_state.json'):
+        self.state_path = state_path
+        self._jobs: Dict[str, Job] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = count()
+        self._cond = threading.Condition()
+        self._last_run: Dict[str, float] = self._load_state()
+        self._stopped = False
+
+    def _load_state(self) -> Dict[str, float]:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке состояния планировщика: {e}")
+            return {}
+
+    def _save_state(self) -> None:
+        if not self.state_path:
+            return
+        try:
+            atomic_write(self.state_path, json.dumps(self._last_run), keep=0)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении состояния планировщика: {e}")
+
+    def add_daily(self, name: str, func: Callable[[], None], at: dt_time,
+                  tz: Optional[str] = None, catch_up: bool = True) -> None:
+        """Регистрирует ежедневную задачу"""
+        self.add(name, func, DailyAt(at, tz), catch_up)
+
+    def add_interval(self, name: str, func: Callable[[], None], seconds: float) -> None:
+        """Регистрирует периодическую задачу"""
+        self.add(name, func, Every(seconds), catch_up=False)
+
+    def add(self, name: str, func: Callable[[], None], schedule, catch_up: bool = True) -> None:
+        with self._cond:
+            existing = self._jobs.get(name)
+            if existing is not None and existing.schedule == schedule:
+                # Расписание не изменилось — меняем только функцию, время запуска прежнее
+                existing.func = func
+                return
+            now = time.time()
+            next_run = schedule.next_after(now)
+            last_run = self._last_run.get(name)
+            if catch_up and last_run is not None and last_run < schedule.previous_before(now):
+                # Пропущенный из-за остановки бота запуск выполняем сразу
+                logger.info(f"Задача {name} пропущена, запускаем с опозданием")
+                next_run = now
+            self._jobs[name] = Job(name, func, schedule, next_run)
+            heapq.heappush(self._heap, (next_run, next(self._seq), name))
+            self._cond.notify()
+
+    def remove(self, name: str) -> None:
+        with self._cond:
+            self._jobs.pop(name, None)
+
+    def job_names(self) -> List[str]:
+        with self._cond:
+            return list(self._jobs)
+
+    def _pop_due(self, now: float) -> List[Job]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            ts, _, name = heapq.heappop(self._heap)
+            job = self._jobs.get(name)
+            # Записи удаленных и перепланированных задач пропускаем
+            if job is None or job.next_run != ts:
+                continue
+            job.next_run = job.schedule.next_after(max(now, ts))
+            heapq.heappush(self._heap, (job.next_run, next(self._seq), name))
+            due.append(job)
+        return due
+
+    def next_due(self) -> Optional[float]:
+        """Время ближайшего запуска (epoch) или None, если задач нет"""
+        with self._cond:
+            while self._heap and self._jobs.get(self._heap[0][2]) is None:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def run_pending(self, executor: Optional[Callable[[Callable[[], None]], None]] = None) -> None:
+        """Запускает все задачи, время которых наступило"""
+        with self._cond:
+            due = self._pop_due(time.time())
+        for job in due:
+            if job.running:
+                logger.warning(f"Задача {job.name} еще выполняется, запуск пропущен")
+                continue
+            job.running = True
+            if executor is None:
+                threading.Thread(target=self._run_job, args=(job,), name=f"job-{job.name}", daemon=True).start()
+            else:
+                executor(lambda job=job: self._run_job(job))
+
+    def _run_job(self, job: Job) -> None:
+        started = time.time()
+        try:
+            job.func()
+        except Exception as e:
+            metrics.JOB_ERRORS.inc(job=job.name)
+            logger.error(f"Ошибка в задаче {job.name}: {e}")
+        finally:
+            metrics.JOB_SECONDS.observe(time.time() - started, job=job.name)
+            job.running = False
+            with self._cond:
+                self._last_run[job.name] = started
+                self._save_state()
+            logger.info(f"Задача {job.name} выполнена за {time.time() - started:.1f} с")
+
+    def run_forever(self) -> None:
+        """Цикл потока планировщика: спит до ближайшей задачи или до изменения расписания"""
+        while not self._stopped:
+            with self._cond:
+                next_run = self.next_due()
+                timeout = None if next_run is None else max(0.0, next_run - time.time())
+                if timeout is None or timeout > 0:
+                    self._cond.wait(timeout)
+            self.run_pending()
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run_forever, name='scheduler', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
@@ -0,0 +1,73 @@
+"""Обработка одного шарда в отдельном процессе.
+
+Запуск: python shard_worker.py cleanup|digest <номер шарда>
+
+Работает только с SQLite-шардами: их можно открывать из нескольких процессов,
+а JSON-шарды принадлежат процессу бота. Число шардов берется из DB_SHARDS.
+digest рассылает сводку пользователям без своего времени рассылки; общий лимит
+отправки бота делится между процессами шардов. Бот при этом запускается с
+DIGEST_IN_PROCESS=0, чтобы не рассылать ту же сводку и не чистить шарды сам.
+"""
+import os
+import sys
+import logging
+from datetime import datetime
+from typing import Dict, Iterator, List, Any, Tuple
+from dotenv import load_dotenv
+from delivery import GLOBAL_RATE, DeliveryEngine
+from digest import daily_digests
+from sharding import global_id, shard_path
+from storage import StorageBackend, open_database
+
+logger = logging.getLogger(__name__)
+
+
+class ShardDigestSource:
+    """Отдает сроки одного шарда с ID в общей нумерации, как у ShardedDatabase"""
+
+    def __init__(self, db: StorageBackend, shard: int, count: int):
+        self.db = db
+        self.shard = shard
+        self.count = count
+
+    def get_due_reminders_by_user(self, start: datetime, end: datetime) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        for user_id, reminders in self.db.get_due_reminders_by_user(start, end):
+            yield user_id, [
+                {**reminder, 'id': global_id(self.shard, reminder['id'], self.count)} for reminder in reminders
+            ]
+
+
+def run(command: str, shard: int) -> None:
+    count = int(os.getenv('DB_SHARDS', '1'))
+    if os.getenv('DB_BACKEND', 'json') != 'sqlite':
+        raise SystemExit("shard_worker работает только с DB_BACKEND=sqlite")
+    if not 0 <= shard < count:
+        raise SystemExit(f"Номер шарда должен быть от 0 до {count - 1}")
+    path = os.getenv('DB_PATH') or 'reminders_data.sqlite3'
+    db = open_database('sqlite', shard_path(path, shard) if count > 1 else path, shards=1)
+    try:
+        if command == 'cleanup':
+            db.delete_old_reminders()
+        elif command == 'digest':
+            import telebot
+            bot = telebot.TeleBot(os.getenv('TOKEN'))
+            engine = DeliveryEngine(
+                lambda chat_id, text: bot.send_message(chat_id, text, parse_mode="Markdown"),
+                workers=int(os.getenv('DELIVERY_WORKERS', '8')),
+                global_rate=GLOBAL_RATE / count
+            )
+            custom_users = set(db.get_user_schedules())
+            stats = engine.run(daily_digests(ShardDigestSource(db, shard, count), None, None, custom_users))
+            logger.info(f"Рассылка шарда {shard} завершена: {stats.summary()}")
+        else:
+            raise SystemExit(f"Неизвестная команда: {command}")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if len(sys.argv) != 3:
+        raise SystemExit(__doc__)
+    run(sys.argv[1], int(sys.argv[2]))
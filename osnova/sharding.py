@@ -0,0 +1,155 @@
+"""Шардирование хранилища по user_id.
+
+Пользователь живет в шарде user_id % N. У каждого шарда свой счетчик ID, а
+снаружи ID кодирует шард: global_id = local_id * N + shard, поэтому
+global_id % N всегда указывает на шард и ID разных шардов не пересекаются.
+Число шардов нельзя менять, пока данные не перенесены: от него зависят ID.
+"""
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+
+def shard_path(path: str, shard: int) -> str:
+    """Путь к файлу шарда: reminders_data.json -> reminders_data.shard0.json"""
+    base, dot, ext = path.rpartition('.')
+    if not dot:
+        return f"{path}.shard{shard}"
+    return f"{base}.shard{shard}.{ext}"
+
+
+def global_id(shard: int, local_id: int, count: int) -> int:
+    return local_id * count + shard
+
+
+class ShardedDatabase(StorageBackend):
+    """Маршрутизатор запросов по шардам; для обработчиков выглядит как одно хранилище"""
+
+    def __init__(self, shards: Sequence[StorageBackend]):
+        super().__init__()
+        self.shards = list(shards)
+        self._pool = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix='shard')
+        for index, shard in enumerate(self.shards):
+            shard.add_listener(lambda event, payload, index=index: self._forward(index, event, payload))
+
+    def shard_of_user(self, user_id: int) -> int:
+        return user_id % len(self.shards)
+
+    def _for_user(self, user_id: int) -> StorageBackend:
+        return self.shards[self.shard_of_user(user_id)]
+
+    def _global_id(self, shard: int, local_id: int) -> int:
+        return global_id(shard, local_id, len(self.shards))
+
+    def _local_id(self, reminder_id: int) -> Tuple[StorageBackend, int]:
+        shard, local_id = reminder_id % len(self.shards), reminder_id // len(self.shards)
+        return self.shards[shard], local_id
+
+    def _forward(self, shard: int, event: str, payload: Dict[str, Any]) -> None:
+        if 'id' in payload:
+            payload = {**payload, 'id': self._global_id(shard, payload['id'])}
+        self._emit(event, payload)
+
+    def _each(self, method: str, *args) -> List[Any]:
+        """Вызывает метод на всех шардах параллельно"""
+        return list(self._pool.map(lambda shard: getattr(shard, method)(*args), self.shards))
+
+    def add_user(self, user_id: int, username: str, first_name: str, last_name: str) -> bool:
+        return self._for_user(user_id).add_user(user_id, username, first_name, last_name)
+
+    def add_reminder(self, user_id: int, text: str, priority: int, days: int) -> Optional[int]:
+        local_id = self._for_user(user_id).add_reminder(user_id, text, priority, days)
+        if local_id is None:
+            return None
+        return self._global_id(self.shard_of_user(user_id), local_id)
+
+    def add_reminders(self, user_id: int, items: List[Tuple[str, int, int]]) -> Optional[List[int]]:
+        local_ids = self._for_user(user_id).add_reminders(user_id, items)
+        if local_ids is None:
+            return None
+        return [self._global_id(self.shard_of_user(user_id), local_id) for local_id in local_ids]
+
+    def get_reminder(self, reminder_id: int) -> Optional[Dict[str, Any]]:
+        shard, local_id = self._local_id(reminder_id)
+        reminder = shard.get_reminder(local_id)
+        if reminder is None:
+            return None
+        return {**reminder, 'id': reminder_id}
+
+    def get_reminder_expiries(self, after: datetime) -> List[Tuple[int, datetime]]:
+        per_shard = [
+            [(expires_at, self._global_id(index, local_id)) for local_id, expires_at in expiries]
+            for index, expiries in enumerate(self._each('get_reminder_expiries', after))
+        ]
+        return [(reminder_id, expires_at) for expires_at, reminder_id in heapq.merge(*per_shard)]
+
+    def _globalize(self, user_id: int, reminders: List[Dict[str, Any]], key: str = 'id') -> List[Dict[str, Any]]:
+        shard = self.shard_of_user(user_id)
+        return [{**reminder, key: self._global_id(shard, reminder[key])} for reminder in reminders]
+
+    def get_today_reminders(self, user_id: int) -> List[Dict[str, Any]]:
+        return self._globalize(user_id, self._for_user(user_id).get_today_reminders(user_id))
+
+    def get_reminders_page(self, user_id: int, offset: int = 0,
+                           limit: int = 10) -> Tuple[List[Dict[str, Any]], bool]:
+        reminders, has_more = self._for_user(user_id).get_reminders_page(user_id, offset, limit)
+        return self._globalize(user_id, reminders), has_more
+
+    def get_current_day_reminders(self, user_id: int) -> List[Dict[str, Any]]:
+        return self._globalize(user_id, self._for_user(user_id).get_current_day_reminders(user_id))
+
+    def get_due_reminders_by_user(self, start: datetime, end: datetime) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        # Шарды опрашиваются параллельно; пользователи в них не пересекаются, группы просто склеиваются
+        per_shard = self._pool.map(lambda shard: list(shard.get_due_reminders_by_user(start, end)), self.shards)
+        for groups in per_shard:
+            for user_id, reminders in groups:
+                yield user_id, self._globalize(user_id, reminders)
+
+    def get_all_users(self) -> List[int]:
+        return [user_id for users in self._each('get_all_users') for user_id in users]
+
+    def set_user_schedule(self, user_id: int, delivery_time: Optional[str], timezone: Optional[str]) -> bool:
+        return self._for_user(user_id).set_user_schedule(user_id, delivery_time, timezone)
+
+    def get_user_schedules(self) -> Dict[int, Tuple[str, Optional[str]]]:
+        schedules = {}
+        for shard_schedules in self._each('get_user_schedules'):
+            schedules.update(shard_schedules)
+        return schedules
+
+    def delete_reminder(self, reminder_id: int, user_id: int, reason: str = "Пользователь удалил") -> bool:
+        shard, local_id = self._local_id(reminder_id)
+        if shard is not self._for_user(user_id):
+            return False
+        return shard.delete_reminder(local_id, user_id, reason)
+
+    def delete_reminders(self, reminder_ids: List[int], user_id: int,
+                         reason: str = "Пользователь удалил") -> List[int]:
+        # ID с чужого шарда не могут принадлежать пользователю и просто отбрасываются
+        shard = self._for_user(user_id)
+        local_ids = [local_id for owner, local_id in map(self._local_id, reminder_ids) if owner is shard]
+        deleted = shard.delete_reminders(local_ids, user_id, reason)
+        return [self._global_id(self.shard_of_user(user_id), local_id) for local_id in deleted]
+
+    def get_deleted_reminders(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        return self._globalize(
+            user_id, self._for_user(user_id).get_deleted_reminders(user_id, limit), 'original_id'
+        )
+
+    def get_deleted_page(self, user_id: int, limit: int = 10, cursor: Optional[str] = None,
+                         newer: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+        items, older_cursor, newer_cursor = self._for_user(user_id).get_deleted_page(user_id, limit, cursor, newer)
+        return self._globalize(user_id, items, 'original_id'), older_cursor, newer_cursor
+
+    def delete_old_reminders(self, limit: Optional[int] = None) -> bool:
+        """Очистка идет во всех шардах одновременно, limit действует на каждый шард"""
+        return all(self._each('delete_old_reminders', limit))
+
+    def close(self) -> None:
+        self._each('close')
+        self._pool.shutdown()
@@ -0,0 +1,362 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta, time as dt_time
+import logging
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+from storage import StorageBackend
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('db_errors.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    registered_at TEXT NOT NULL,
+    delivery_time TEXT,
+    timezone TEXT
+);
+CREATE TABLE IF NOT EXISTS reminders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL,
+    is_completed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_reminders_user ON reminders (user_id, priority DESC, id);
+CREATE INDEX IF NOT EXISTS idx_reminders_expires ON reminders (expires_at);
+CREATE TABLE IF NOT EXISTS deleted_reminders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    original_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    deleted_at TEXT NOT NULL,
+    reason TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_deleted_user ON deleted_reminders (user_id, deleted_at);
+CREATE INDEX IF NOT EXISTS idx_deleted_at ON deleted_reminders (deleted_at);
+"""
+
+# Запросы вынесены в константы: sqlite3 кэширует подготовленные выражения по тексту
+SQL_UPSERT_USER = """
+    INSERT INTO users (user_id, username, first_name, last_name, registered_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        username = excluded.username,
+        first_name = excluded.first_name,
+        last_name = excluded.last_name,
+        registered_at = excluded.registered_at
+"""
+SQL_INSERT_REMINDER = """
+    INSERT INTO reminders (user_id, text, priority, created_at, expires_at, is_completed)
+    VALUES (?, ?, ?, ?, ?, 0)
+"""
+SQL_ACTIVE_REMINDERS = """
+    SELECT id, text, priority, expires_at FROM reminders
+    WHERE user_id = ? AND expires_at >= ? AND is_completed = 0
+    ORDER BY priority DESC, id
+"""
+SQL_ACTIVE_PAGE = """
+    SELECT id, text, priority, expires_at FROM reminders
+    WHERE user_id = ? AND expires_at >= ? AND is_completed = 0
+    ORDER BY priority DESC, id
+    LIMIT ? OFFSET ?
+"""
+SQL_DAY_REMINDERS = """
+    SELECT id, text, priority FROM reminders
+    WHERE user_id = ? AND expires_at >= ? AND expires_at < ? AND is_completed = 0
+    ORDER BY priority DESC, id
+"""
+SQL_DUE_REMINDERS = """
+    SELECT user_id, id, text, priority FROM reminders
+    WHERE expires_at >= ? AND expires_at < ? AND is_completed = 0
+    ORDER BY user_id, priority DESC, id
+"""
+SQL_ARCHIVE_REMINDERS = """
+    INSERT INTO deleted_reminders (original_id, user_id, text, priority, created_at, deleted_at, reason)
+    SELECT id, user_id, text, priority, created_at, ?, ? FROM reminders
+"""
+
+SQL_EXPIRED_REMINDERS = """
+    SELECT id, user_id FROM reminders WHERE expires_at < ? ORDER BY expires_at LIMIT ?
+"""
+
+SQL_DELETED_REMINDERS = """
+    SELECT original_id, user_id, text, priority, created_at, deleted_at, reason
+    FROM deleted_reminders
+    WHERE user_id = ?
+    ORDER BY deleted_at DESC
+    LIMIT ?
+"""
+
+SQL_DELETED_PAGE = """
+    SELECT id, original_id, user_id, text, priority, created_at, deleted_at, reason
+    FROM deleted_reminders
+    WHERE user_id = ? AND (deleted_at, id) < (?, ?)
+    ORDER BY deleted_at DESC, id DESC
+    LIMIT ?
+"""
+
+SQL_DELETED_PAGE_NEWER = """
+    SELECT id, original_id, user_id, text, priority, created_at, deleted_at, reason
+    FROM deleted_reminders
+    WHERE user_id = ? AND (deleted_at, id) > (?, ?)
+    ORDER BY deleted_at, id
+    LIMIT ?
+"""
+
+
+class SQLiteDatabase(StorageBackend):
+    def __init__(self, file_path: str = 'data.sqlite3'):
+        super().__init__()
+        self.file_path = file_path
+        # Соединение общее для потоков telebot, доступ сериализуется блокировкой
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(file_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate_schema()
+        logger.info("SQLite база данных открыта")
+
+    def _migrate_schema(self) -> None:
+        """Добавляет колонки, появившиеся после создания базы"""
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(users)")}
+        with self.conn:
+            for column in ('delivery_time', 'timezone'):
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE users ADD COLUMN {column} TEXT")
+
+    def add_user(self, user_id: int, username: str, first_name: str, last_name: str) -> bool:
+        """Добавляет пользователя"""
+        try:
+            with self._lock, self.conn:
+                self.conn.execute(
+                    SQL_UPSERT_USER,
+                    (user_id, username, first_name, last_name, datetime.now().isoformat())
+                )
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при добавлении пользователя: {e}")
+            return False
+
+    def add_reminder(self, user_id: int, text: str, priority: int, days: int) -> Optional[int]:
+        """Добавляет напоминание и возвращает его ID"""
+        reminder_ids = self.add_reminders(user_id, [(text, priority, days)])
+        return reminder_ids[0] if reminder_ids else None
+
+    def add_reminders(self, user_id: int, items: List[Tuple[str, int, int]]) -> Optional[List[int]]:
+        """Добавляет пачку напоминаний одной транзакцией"""
+        now = datetime.now()
+        added = []
+        try:
+            with self._lock, self.conn:
+                for text, priority, days in items:
+                    expires_at = now + timedelta(days=days)
+                    cursor = self.conn.execute(
+                        SQL_INSERT_REMINDER,
+                        (user_id, text, priority, now.isoformat(), expires_at.isoformat())
+                    )
+                    added.append((cursor.lastrowid, expires_at))
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при добавлении напоминаний: {e}")
+            return None
+        for reminder_id, expires_at in added:
+            self._emit('added', {'id': reminder_id, 'user_id': user_id, 'expires_at': expires_at})
+        return [reminder_id for reminder_id, _ in added]
+
+    def get_reminder(self, reminder_id: int) -> Optional[Dict[str, Any]]:
+        """Возвращает активное напоминание по ID"""
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM reminders WHERE id = ?", (reminder_id,)).fetchone()
+        if row is None:
+            return None
+        reminder = dict(row)
+        reminder['is_completed'] = bool(reminder['is_completed'])
+        reminder['created_at'] = datetime.fromisoformat(reminder['created_at'])
+        reminder['expires_at'] = datetime.fromisoformat(reminder['expires_at'])
+        return reminder
+
+    def get_reminder_expiries(self, after: datetime) -> List[Tuple[int, datetime]]:
+        """Возвращает (id, срок) напоминаний со сроком не раньше after"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, expires_at FROM reminders WHERE expires_at >= ? ORDER BY expires_at",
+                (after.isoformat(),)
+            ).fetchall()
+        return [(row['id'], datetime.fromisoformat(row['expires_at'])) for row in rows]
+
+    def get_today_reminders(self, user_id: int) -> List[Dict[str, Any]]:
+        """Возвращает все активные напоминания пользователя (не только на сегодня)"""
+        with self._lock:
+            rows = self.conn.execute(SQL_ACTIVE_REMINDERS, (user_id, datetime.now().isoformat())).fetchall()
+        # Сроки разбираются здесь, на границе хранилища, как и в JSONDatabase
+        return [{**row, 'expires_at': datetime.fromisoformat(row['expires_at'])} for row in map(dict, rows)]
+
+    def get_reminders_page(self, user_id: int, offset: int = 0,
+                           limit: int = 10) -> Tuple[List[Dict[str, Any]], bool]:
+        """Возвращает страницу активных напоминаний и признак следующей страницы"""
+        with self._lock:
+            rows = self.conn.execute(
+                SQL_ACTIVE_PAGE, (user_id, datetime.now().isoformat(), limit + 1, offset)
+            ).fetchall()
+        page = [{**row, 'expires_at': datetime.fromisoformat(row['expires_at'])} for row in map(dict, rows[:limit])]
+        return page, len(rows) > limit
+
+    def get_current_day_reminders(self, user_id: int) -> List[Dict[str, Any]]:
+        """Возвращает напоминания, срок которых истекает сегодня"""
+        today = datetime.combine(datetime.now().date(), dt_time())
+        tomorrow = today + timedelta(days=1)
+        with self._lock:
+            rows = self.conn.execute(
+                SQL_DAY_REMINDERS, (user_id, today.isoformat(), tomorrow.isoformat())
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_due_reminders_by_user(self, start: datetime, end: datetime) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """Возвращает напоминания со сроком в [start, end), сгруппированные по пользователям"""
+        with self._lock:
+            rows = self.conn.execute(SQL_DUE_REMINDERS, (start.isoformat(), end.isoformat())).fetchall()
+        for user_id, group in groupby(rows, key=lambda row: row['user_id']):
+            yield user_id, [
+                {'id': row['id'], 'text': row['text'], 'priority': row['priority']}
+                for row in group
+            ]
+
+    def get_all_users(self) -> List[int]:
+        """Возвращает список всех пользователей"""
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT user_id FROM users")]
+
+    def set_user_schedule(self, user_id: int, delivery_time: Optional[str], timezone: Optional[str]) -> bool:
+        """Задает время ежедневной рассылки пользователя"""
+        try:
+            with self._lock, self.conn:
+                cursor = self.conn.execute(
+                    "UPDATE users SET delivery_time = ?, timezone = ? WHERE user_id = ?",
+                    (delivery_time, timezone, user_id)
+                )
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при сохранении времени рассылки: {e}")
+            return False
+
+    def get_user_schedules(self) -> Dict[int, Tuple[str, Optional[str]]]:
+        """Возвращает пользователей со своим временем рассылки"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT user_id, delivery_time, timezone FROM users WHERE delivery_time IS NOT NULL"
+            ).fetchall()
+        return {row['user_id']: (row['delivery_time'], row['timezone']) for row in rows}
+
+    def delete_reminder(self, reminder_id: int, user_id: int, reason: str = "Пользователь удалил") -> bool:
+        """Удаляет напоминание с сохранением в истории"""
+        return bool(self.delete_reminders([reminder_id], user_id, reason))
+
+    def delete_reminders(self, reminder_ids: List[int], user_id: int,
+                         reason: str = "Пользователь удалил") -> List[int]:
+        """Удаляет несколько напоминаний пользователя одной транзакцией"""
+        now = datetime.now().isoformat()
+        deleted = []
+        try:
+            with self._lock, self.conn:
+                for reminder_id in dict.fromkeys(reminder_ids):
+                    cursor = self.conn.execute(
+                        SQL_ARCHIVE_REMINDERS + " WHERE id = ? AND user_id = ?",
+                        (now, reason, reminder_id, user_id)
+                    )
+                    if cursor.rowcount:
+                        deleted.append(reminder_id)
+                self.conn.executemany("DELETE FROM reminders WHERE id = ?", [(reminder_id,) for reminder_id in deleted])
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при удалении напоминаний: {e}")
+            return []
+        for reminder_id in deleted:
+            self._emit('deleted', {'id': reminder_id, 'user_id': user_id})
+        return deleted
+
+    def get_deleted_reminders(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """Возвращает историю удаленных напоминаний"""
+        with self._lock:
+            rows = self.conn.execute(SQL_DELETED_REMINDERS, (user_id, limit)).fetchall()
+        return [
+            {**row, 'created_at': datetime.fromisoformat(row['created_at']),
+             'deleted_at': datetime.fromisoformat(row['deleted_at'])}
+            for row in map(dict, rows)
+        ]
+
+    def get_deleted_page(self, user_id: int, limit: int = 10, cursor: Optional[str] = None,
+                         newer: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+        """Возвращает страницу истории и курсоры соседних страниц"""
+        # Курсор — (deleted_at, id) крайней показанной записи; строка без курсора больше любой даты
+        deleted_at, row_id = cursor.rsplit('|', 1) if cursor else ('~', 0)
+        newer = newer and cursor is not None
+        with self._lock:
+            rows = self.conn.execute(
+                SQL_DELETED_PAGE_NEWER if newer else SQL_DELETED_PAGE,
+                (user_id, deleted_at, int(row_id) if cursor else 0, limit + 1)
+            ).fetchall()
+        page = [dict(row) for row in rows[:limit]]
+        if newer:
+            page.reverse()
+        # За курсором страница есть всегда: с нее пользователь и пришел
+        more_older = cursor is not None if newer else len(rows) > limit
+        more_newer = len(rows) > limit if newer else cursor is not None
+        older_cursor = f"{page[-1]['deleted_at']}|{page[-1]['id']}" if page and more_older else None
+        newer_cursor = f"{page[0]['deleted_at']}|{page[0]['id']}" if page and more_newer else None
+        for row in page:
+            del row['id']
+            row['created_at'] = datetime.fromisoformat(row['created_at'])
+            row['deleted_at'] = datetime.fromisoformat(row['deleted_at'])
+        return page, older_cursor, newer_cursor
+
+    def delete_old_reminders(self, limit: Optional[int] = None) -> bool:
+        """Удаляет не больше limit истекших напоминаний и чистит историю старше 30 дней"""
+        now = datetime.now().isoformat()
+        month_ago = (datetime.now() - timedelta(days=30)).isoformat()
+        try:
+            # Перенос в историю, удаление и очистка истории — одна транзакция
+            with self._lock, self.conn:
+                # LIMIT -1 в SQLite означает «без ограничения»
+                expired = self.conn.execute(SQL_EXPIRED_REMINDERS, (now, -1 if limit is None else limit)).fetchall()
+                ids = [(row['id'],) for row in expired]
+                self.conn.executemany(
+                    SQL_ARCHIVE_REMINDERS + " WHERE id = ?",
+                    [(now, 'Автоматическое удаление (истек срок)', reminder_id) for reminder_id, in ids]
+                )
+                self.conn.executemany("DELETE FROM reminders WHERE id = ?", ids)
+                purged = self.conn.execute(
+                    "SELECT DISTINCT user_id FROM deleted_reminders WHERE deleted_at < ?", (month_ago,)
+                ).fetchall()
+                self.conn.execute("DELETE FROM deleted_reminders WHERE deleted_at < ?", (month_ago,))
+            for row in expired:
+                self._emit('deleted', {'id': row['id'], 'user_id': row['user_id']})
+            for row in purged:
+                self._emit('purged', {'user_id': row['user_id']})
+            if expired:
+                logger.info(f"Очистка: удалено истекших напоминаний — {len(expired)}")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при очистке напоминаний: {e}")
+            return False
+
+    def close(self) -> None:
+        """Закрывает соединение с базой"""
+        with self._lock:
+            self.conn.close()
+        logger.info("Соединение с SQLite закрыто")
@@ -0,0 +1,152 @@
+import os
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Any, Tuple
+
+# Подписчик получает событие ('added' или 'deleted') и данные напоминания (id, user_id, expires_at);
+# 'purged' с одним user_id означает, что из истории пользователя удалены старые записи
+Listener = Callable[[str, Dict[str, Any]], None]
+
+logger = logging.getLogger(__name__)
+
+# Очистка идет небольшими порциями раз в CLEANUP_INTERVAL секунд, а не одним проходом в полночь
+CLEANUP_INTERVAL = int(os.getenv('CLEANUP_INTERVAL', '60'))
+CLEANUP_BATCH = int(os.getenv('CLEANUP_BATCH', '500'))
+
+
+class StorageBackend(ABC):
+    """Интерфейс хранилища, через который бот работает с данными"""
+
+    def __init__(self):
+        self._listeners: List[Listener] = []
+
+    def add_listener(self, listener: Listener) -> None:
+        """Подписывает на добавление и удаление напоминаний"""
+        self._listeners.append(listener)
+
+    def _emit(self, event: str, reminder: Dict[str, Any]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event, reminder)
+            except Exception as e:
+                # Ошибка подписчика не должна ломать запись в хранилище
+                logger.error(f"Ошибка в обработчике события {event}: {e}")
+
+    @abstractmethod
+    def add_user(self, user_id: int, username: str, first_name: str, last_name: str) -> bool:
+        """Добавляет пользователя"""
+
+    @abstractmethod
+    def add_reminder(self, user_id: int, text: str, priority: int, days: int) -> Optional[int]:
+        """Добавляет напоминание и возвращает его ID"""
+
+    @abstractmethod
+    def add_reminders(self, user_id: int, items: List[Tuple[str, int, int]]) -> Optional[List[int]]:
+        """Добавляет пачку напоминаний (текст, приоритет, дни) одной записью; возвращает их ID"""
+
+    @abstractmethod
+    def get_reminder(self, reminder_id: int) -> Optional[Dict[str, Any]]:
+        """Возвращает активное напоминание по ID или None"""
+
+    @abstractmethod
+    def get_reminder_expiries(self, after: datetime) -> List[Tuple[int, datetime]]:
+        """Возвращает (id, срок) всех напоминаний со сроком не раньше after"""
+
+    @abstractmethod
+    def get_today_reminders(self, user_id: int) -> List[Dict[str, Any]]:
+        """Возвращает все активные напоминания пользователя по убыванию приоритета;
+        expires_at — datetime"""
+
+    @abstractmethod
+    def get_reminders_page(self, user_id: int, offset: int = 0,
+                           limit: int = 10) -> Tuple[List[Dict[str, Any]], bool]:
+        """Возвращает limit активных напоминаний пользователя, начиная с offset, в порядке
+        get_today_reminders, и признак того, что за страницей есть еще"""
+
+    @abstractmethod
+    def get_current_day_reminders(self, user_id: int) -> List[Dict[str, Any]]:
+        """Возвращает напоминания, срок которых истекает сегодня"""
+
+    @abstractmethod
+    def get_due_reminders_by_user(self, start: datetime, end: datetime) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """Возвращает активные напоминания со сроком в [start, end), сгруппированные по пользователям"""
+
+    @abstractmethod
+    def get_all_users(self) -> List[int]:
+        """Возвращает список всех пользователей"""
+
+    @abstractmethod
+    def set_user_schedule(self, user_id: int, delivery_time: Optional[str], timezone: Optional[str]) -> bool:
+        """Задает время ежедневной рассылки пользователя ('ЧЧ:ММ') и его часовой пояс"""
+
+    @abstractmethod
+    def get_user_schedules(self) -> Dict[int, Tuple[str, Optional[str]]]:
+        """Возвращает {user_id: (время, часовой пояс)} для пользователей со своим временем рассылки"""
+
+    @abstractmethod
+    def delete_reminder(self, reminder_id: int, user_id: int, reason: str = "Пользователь удалил") -> bool:
+        """Удаляет напоминание с сохранением в истории"""
+
+    @abstractmethod
+    def delete_reminders(self, reminder_ids: List[int], user_id: int,
+                         reason: str = "Пользователь удалил") -> List[int]:
+        """Удаляет напоминания пользователя одной записью; возвращает ID действительно удаленных"""
+
+    @abstractmethod
+    def get_deleted_reminders(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """Возвращает историю удаленных напоминаний, новые первыми;
+        created_at и deleted_at — datetime"""
+
+    @abstractmethod
+    def get_deleted_page(self, user_id: int, limit: int = 10, cursor: Optional[str] = None,
+                         newer: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+        """Возвращает страницу истории (новые первыми), курсор более старой и курсор более новой
+        страницы (None — страницы нет); newer=True — страница новее cursor, иначе старше"""
+
+    @abstractmethod
+    def delete_old_reminders(self, limit: Optional[int] = None) -> bool:
+        """Удаляет не больше limit истекших напоминаний (раньше всех истекшие первыми)
+        и чистит историю старше 30 дней"""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Сохраняет данные и освобождает ресурсы"""
+
+
+def open_database(backend: Optional[str] = None, path: Optional[str] = None,
+                  shards: Optional[int] = None) -> StorageBackend:
+    """Создает хранилище по настройкам DB_BACKEND (json|sqlite), DB_PATH и DB_SHARDS"""
+    backend = backend or os.getenv('DB_BACKEND', 'json')
+    path = path or os.getenv('DB_PATH') or (
+        'reminders_data.sqlite3' if backend == 'sqlite' else 'reminders_data.json'
+    )
+    # DB_SHARDS > 1 раскладывает пользователей по отдельным файлам по user_id
+    shards = shards or int(os.getenv('DB_SHARDS', '1'))
+    if shards > 1:
+        from sharding import ShardedDatabase, shard_path
+        paths = [shard_path(path, i) for i in range(shards)]
+        # Иначе бот молча стартовал бы с пустыми шардами рядом с прежними данными
+        if os.path.exists(path) and not any(os.path.exists(shard) for shard in paths):
+            raise RuntimeError(
+                f"Найдено нешардированное хранилище {path}, а файлов шардов нет: "
+                f"перенесите данные по шардам или уберите DB_SHARDS"
+            )
+        return ShardedDatabase([_open_backend(backend, shard) for shard in paths])
+    return _open_backend(backend, path)
+
+
+def _open_backend(backend: str, path: str) -> StorageBackend:
+    if backend == 'sqlite':
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(path)
+    if backend == 'json':
+        from database import JSONDatabase
+        # DB_JOURNAL=1 включает журнал изменений вместо полной перезаписи
+        # DB_SAVE_DELAY — окно объединения изменений перед фоновой записью, 0 — писать сразу
+        return JSONDatabase(
+            path,
+            journal=os.getenv('DB_JOURNAL') == '1',
+            save_delay=float(os.getenv('DB_SAVE_DELAY', '1.0'))
+        )
+    raise ValueError(f"Неизвестный тип хранилища: {backend}")
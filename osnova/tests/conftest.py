@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули бота импортируются по имени, как при запуске из каталога osnova
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
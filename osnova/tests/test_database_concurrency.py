@@ -0,0 +1,106 @@
+"""Нагрузочная проверка JSONDatabase: параллельные писатели и очистка.
+
+Писатели добавляют и удаляют свои напоминания, часть из них уже истекла и
+снимается параллельными вызовами delete_old_reminders. После закрытия база
+перечитывается с диска и должна совпасть с состоянием в памяти.
+"""
+import time
+import random
+import threading
+
+import pytest
+
+from database import JSONDatabase
+
+WRITERS = 8
+SWEEPERS = 2
+ROUNDS = 150
+
+
+def run_load(db):
+    """Гоняет писателей и чистильщиков; возвращает выданные ID и ID удаленных"""
+    issued = []
+    deleted = []
+    errors = []
+    lock = threading.Lock()
+    writers_done = threading.Event()
+
+    def writer(user_id):
+        rnd = random.Random(user_id)
+        try:
+            db.add_user(user_id, f'user{user_id}', 'Имя', 'Фамилия')
+            own = []
+            for round_no in range(ROUNDS):
+                # Отрицательный срок — напоминание уже истекло и достанется чистильщику
+                if rnd.random() < 0.3:
+                    ids = db.add_reminders(user_id, [(f'{user_id}-{round_no}-{i}', 2, rnd.choice((-1, 3)))
+                                                     for i in range(3)])
+                else:
+                    ids = [db.add_reminder(user_id, f'{user_id}-{round_no}', 1, rnd.choice((-1, 1, 5)))]
+                assert ids and None not in ids
+                own.extend(ids)
+                if own and rnd.random() < 0.3:
+                    victims = rnd.sample(own, min(len(own), 2))
+                    removed = db.delete_reminders(victims, user_id)
+                    own = [reminder_id for reminder_id in own if reminder_id not in removed]
+                    with lock:
+                        deleted.extend(removed)
+                with lock:
+                    issued.extend(ids)
+        except Exception as e:  # pragma: no cover - ошибка всплывет в основном потоке
+            errors.append(e)
+
+    def sweeper():
+        try:
+            while not writers_done.is_set():
+                assert db.delete_old_reminders(limit=50)
+                # Пауза как у периодической задачи: без нее чистильщики вытесняют писателей
+                time.sleep(0.005)
+            assert db.delete_old_reminders()
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    writers = [threading.Thread(target=writer, args=(1000 + n,)) for n in range(WRITERS)]
+    sweepers = [threading.Thread(target=sweeper) for _ in range(SWEEPERS)]
+    for thread in writers + sweepers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    writers_done.set()
+    for thread in sweepers:
+        thread.join()
+    assert not errors, errors
+    return issued, deleted
+
+
+def state(db):
+    snapshot = db.snapshot()
+    return {
+        'users': snapshot['users'],
+        'reminders': {reminder_id: reminder.to_dict() for reminder_id, reminder in snapshot['reminders'].items()},
+        'last_reminder_id': snapshot['last_reminder_id'],
+        'history': sorted(item.original_id for item in db.history),
+    }
+
+
+@pytest.mark.parametrize('journal', [True, False], ids=['journal', 'rewrite'])
+def test_concurrent_writers_and_sweepers(tmp_path, journal):
+    path = str(tmp_path / 'reminders_data.json')
+    # Маленький compact_every заставляет сжатие журнала идти параллельно с записью
+    db = JSONDatabase(path, journal=journal, compact_every=50, save_delay=0.01)
+    issued, deleted = run_load(db)
+
+    assert len(issued) == len(set(issued))
+    assert db.data['last_reminder_id'] == max(issued)
+    assert all(db.get_reminder(reminder_id) is None for reminder_id in deleted)
+    before = state(db)
+    # Каждое исчезнувшее напоминание попало в историю ровно один раз
+    assert len(before['history']) == len(set(before['history']))
+    assert set(before['history']) == set(issued) - set(before['reminders'])
+    db.close()
+
+    reloaded = JSONDatabase(path, journal=journal, save_delay=0)
+    try:
+        assert state(reloaded) == before
+    finally:
+        reloaded.close()
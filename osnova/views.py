@@ -0,0 +1,337 @@
+"""Тексты сообщений и клавиатуры, общие для синхронного и асинхронного бота.
+
+telebot импортируется только при сборке клавиатур: рассылке в shard_worker.py,
+миграции и замерам нужны лишь тексты, и они запускаются без загрузки telebot.
+"""
+import time
+from datetime import datetime, timedelta
+from render_cache import earliest_expiry
+from storage import CLEANUP_INTERVAL
+
+# Эмодзи для приоритетов
+PRIORITY_EMOJIS = {
+    5: "🔴‼️",
+    4: "🟠",
+    3: "🟡",
+    2: "🟢",
+    1: "🔵",
+    0: "⚪️"
+}
+
+ERROR_TEXT = "⚠️ Произошла ошибка. Попробуйте позже."
+
+# Предел длины сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+# Напоминаний на странице списка и клавиатур удаления
+REMINDERS_PAGE_SIZE = 10
+
+# Длина текста напоминания в списке: с остальными полями (около 70 символов) страница
+# из REMINDERS_PAGE_SIZE записей всегда влезает в MESSAGE_LIMIT, поэтому страницы одинаковые
+LIST_TEXT_LIMIT = 300
+
+# Записей истории на странице: даже при тексте в 500 символов страница влезает в одно сообщение
+HISTORY_PAGE_SIZE = 5
+
+# Быстрое добавление: не больше строк за раз и значения по умолчанию для «текст | приоритет | дни»
+QUICK_ADD_LIMIT = 50
+QUICK_ADD_PRIORITY = 3
+QUICK_ADD_DAYS = 1
+QUICK_ADD_HELP = (
+    "Каждая строка — отдельное напоминание: текст | приоритет 0-5 | дни 1-7.\n"
+    f"Приоритет и дни можно опустить (по умолчанию {QUICK_ADD_PRIORITY} и {QUICK_ADD_DAYS}).\n\n"
+    "/add_many\n"
+    "Купить хлеб\n"
+    "Позвонить маме | 5 | 2"
+)
+
+
+def main_menu_markup():
+    from telebot import types
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    btn1 = types.KeyboardButton('➕ Добавить напоминание')
+    btn2 = types.KeyboardButton('📋 Мои напоминания')
+    btn3 = types.KeyboardButton('❌ Удалить напоминание')
+    btn4 = types.KeyboardButton('🗑 История удаленных')
+    markup.add(btn1, btn2, btn3, btn4)
+    return markup
+
+
+def __getattr__(name):
+    # Главное меню не зависит от пользователя: собирается при первом обращении и переиспользуется
+    if name == 'MAIN_MENU':
+        global MAIN_MENU
+        MAIN_MENU = main_menu_markup()
+        return MAIN_MENU
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def priority_markup():
+    from telebot import types
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+    for i in range(6):
+        markup.add(types.KeyboardButton(str(i)))
+    return markup
+
+
+def days_markup():
+    from telebot import types
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+    for i in range(1, 8):
+        markup.add(types.KeyboardButton(str(i)))
+    return markup
+
+
+def confirm_deletion_markup(reminder_id):
+    from telebot import types
+    markup = types.InlineKeyboardMarkup()
+    markup.add(
+        types.InlineKeyboardButton("✅ Да", callback_data=f"del_confirm_{reminder_id}"),
+        types.InlineKeyboardButton("❌ Нет", callback_data="del_cancel")
+    )
+    return markup
+
+
+def _button_label(prefix, reminder):
+    id_ = reminder['id']
+    text = reminder['text']
+    return f"{prefix} #{id_}: {text[:20]}..." if len(text) > 20 else f"{prefix} #{id_}: {text}"
+
+
+def _nav_buttons(prefix, offset, next_offset):
+    """Кнопки «назад/вперед» для страницы, начинающейся с offset; callback_data: <prefix>:<offset>"""
+    from telebot import types
+    buttons = []
+    if offset > 0:
+        buttons.append(types.InlineKeyboardButton(
+            "◀️ Назад", callback_data=f"{prefix}:{max(0, offset - REMINDERS_PAGE_SIZE)}"
+        ))
+    if next_offset is not None:
+        buttons.append(types.InlineKeyboardButton("Вперед ▶️", callback_data=f"{prefix}:{next_offset}"))
+    return buttons
+
+
+def reminders_page_markup(offset, next_offset):
+    """Навигация по списку напоминаний; next_offset — начало следующей страницы или None"""
+    from telebot import types
+    buttons = _nav_buttons("rem", offset, next_offset)
+    if not buttons:
+        return None
+    markup = types.InlineKeyboardMarkup()
+    markup.row(*buttons)
+    return markup
+
+
+def delete_page_markup(reminders, offset, has_more):
+    """Страница выбора напоминания для удаления: кнопка ведет к подтверждению"""
+    from telebot import types
+    markup = types.InlineKeyboardMarkup()
+    for reminder in reminders:
+        markup.add(types.InlineKeyboardButton(
+            _button_label("❌", reminder), callback_data=f"del_ask_{reminder['id']}"
+        ))
+    buttons = _nav_buttons("delp", offset, offset + len(reminders) if has_more else None)
+    if buttons:
+        markup.row(*buttons)
+    markup.add(types.InlineKeyboardButton("Отмена", callback_data="del_cancel"))
+    return markup
+
+
+def multi_delete_markup(reminders, offset=0, has_more=False, selected=frozenset()):
+    """Inline-клавиатура с отметками на странице; выбор хранится в callback_data кнопок: mdel:<id>:<0|1>"""
+    from telebot import types
+    markup = types.InlineKeyboardMarkup()
+    for reminder in reminders:
+        id_ = reminder['id']
+        mark = "☑️" if id_ in selected else "⬜️"
+        markup.add(types.InlineKeyboardButton(
+            _button_label(mark, reminder), callback_data=f"mdel:{id_}:{int(id_ in selected)}"
+        ))
+    buttons = _nav_buttons("mdel_page", offset, offset + len(reminders) if has_more else None)
+    if buttons:
+        markup.row(*buttons)
+    markup.add(
+        types.InlineKeyboardButton(f"🗑 Удалить выбранные ({len(selected)})", callback_data=f"mdel_apply:{offset}"),
+        types.InlineKeyboardButton("❌ Отмена", callback_data="del_cancel")
+    )
+    return markup
+
+
+def multi_delete_selection(markup):
+    """ID, отмеченные на клавиатуре multi_delete_markup, и начало показанной страницы"""
+    selected = set()
+    offset = 0
+    for row in markup.keyboard if markup else ():
+        for button in row:
+            parts = (button.callback_data or '').split(':')
+            if len(parts) == 3 and parts[2] == '1':
+                selected.add(int(parts[1]))
+            elif parts[0] == 'mdel_apply':
+                offset = int(parts[1])
+    return selected, offset
+
+
+def history_page_markup(older_cursor, newer_cursor=None):
+    from telebot import types
+    buttons = []
+    if newer_cursor is not None:
+        buttons.append(types.InlineKeyboardButton("◀️ Новее", callback_data=f"history_new:{newer_cursor}"))
+    if older_cursor is not None:
+        buttons.append(types.InlineKeyboardButton("Старше ▶️", callback_data=f"history:{older_cursor}"))
+    if not buttons:
+        return None
+    markup = types.InlineKeyboardMarkup()
+    markup.row(*buttons)
+    return markup
+
+
+def format_greeting(first_name):
+    return (
+        f"Привет, {first_name}! Я бот-напоминалка.\n"
+        "Используйте кнопки ниже для управления напоминаниями.\n"
+        "Несколько сразу: /add_many и /delete_many."
+    )
+
+
+def format_added(reminder_id, text, priority, days):
+    expires_date = (datetime.now() + timedelta(days=days)).strftime('%d.%m.%Y')
+    return (
+        f"✅ Напоминание добавлено!\n"
+        f"ID: {reminder_id}\n"
+        f"Текст: {text}\n"
+        f"Приоритет: {priority}\n"
+        f"Активно до: {expires_date}"
+    )
+
+
+def parse_quick_add(text):
+    """Разбирает строки «текст | приоритет | дни» после команды.
+
+    Возвращает (напоминания, ошибки): [(текст, приоритет, дни)] и список сообщений
+    об ошибках с номерами строк.
+    """
+    lines = [line.strip() for line in text.split('\n')[1:] if line.strip()]
+    items, errors = [], []
+    if len(lines) > QUICK_ADD_LIMIT:
+        return [], [f"Не больше {QUICK_ADD_LIMIT} напоминаний за раз."]
+    for number, line in enumerate(lines, 1):
+        parts = [part.strip() for part in line.split('|')]
+        reminder_text = parts[0]
+        try:
+            if len(parts) > 3:
+                raise ValueError
+            priority = int(parts[1]) if len(parts) > 1 else QUICK_ADD_PRIORITY
+            days = int(parts[2]) if len(parts) > 2 else QUICK_ADD_DAYS
+        except ValueError:
+            errors.append(f"Строка {number}: ожидается «текст | приоритет | дни».")
+            continue
+        if not reminder_text or len(reminder_text) > 500:
+            errors.append(f"Строка {number}: текст от 1 до 500 символов.")
+        elif not 0 <= priority <= 5:
+            errors.append(f"Строка {number}: приоритет от 0 до 5.")
+        elif not 1 <= days <= 7:
+            errors.append(f"Строка {number}: срок от 1 до 7 дней.")
+        else:
+            items.append((reminder_text, priority, days))
+    return items, errors
+
+
+def format_added_many(reminder_ids, items):
+    parts = [f"✅ Добавлено напоминаний: {len(reminder_ids)}\n"]
+    for reminder_id, (text, priority, days) in zip(reminder_ids, items):
+        expires_date = (datetime.now() + timedelta(days=days)).strftime('%d.%m.%Y')
+        # Тексты укорачиваются: QUICK_ADD_LIMIT строк должны влезть в одно сообщение
+        text = f"{text[:30]}..." if len(text) > 30 else text
+        parts.append(f"#{reminder_id}: {text} (приоритет {priority}, до {expires_date})\n")
+    return "".join(parts)
+
+
+def _fit(header, parts, reserve=0):
+    """Сколько первых частей помещается в одно сообщение вместе с заголовком и reserve символами хвоста"""
+    size = len(header) + reserve
+    for count, part in enumerate(parts):
+        size += len(part)
+        if size > MESSAGE_LIMIT:
+            return count
+    return len(parts)
+
+
+def format_daily_digest(reminders):
+    header = "📅 *Ваши задачи на сегодня:*\n\n"
+    parts = [
+        f"{PRIORITY_EMOJIS.get(reminder['priority'], '')} *{reminder['text']}* "
+        f"(Приоритет: {reminder['priority']}/5)\nID: {reminder['id']}\n\n"
+        for reminder in reminders
+    ]
+    shown = _fit(header, parts)
+    if shown == len(parts):
+        return header + "".join(parts)
+    # Остаток не влезает в сообщение: самые важные задачи идут первыми, остальные — в «Мои напоминания»
+    tail = "…и еще {} — в «📋 Мои напоминания»"
+    shown = _fit(header, parts, len(tail) + 6)
+    return header + "".join(parts[:shown]) + tail.format(len(parts) - shown)
+
+
+def format_expiry_notice(reminder):
+    emoji = PRIORITY_EMOJIS.get(reminder['priority'], "")
+    return (
+        f"⏰ *Срок напоминания наступил:*\n\n"
+        f"{emoji} *{reminder['text']}* (Приоритет: {reminder['priority']}/5)\n"
+        f"ID: {reminder['id']}"
+    )
+
+
+def format_reminders(reminders):
+    """Текст страницы списка; длинные тексты укорачиваются до LIST_TEXT_LIMIT"""
+    parts = ["📋 *Ваши активные напоминания:*\n\n"]
+    for reminder in reminders:
+        priority = reminder['priority']
+        emoji = PRIORITY_EMOJIS.get(priority, "")
+        text = reminder['text']
+        if len(text) > LIST_TEXT_LIMIT:
+            text = f"{text[:LIST_TEXT_LIMIT]}..."
+        parts.append(
+            f"{emoji} *{text}*\n"
+            f"Приоритет: {priority}/5\n"
+            f"ID: {reminder['id']}\n"
+            f"Активно до: {reminder['expires_at'].strftime('%d.%m.%Y')}\n\n"
+        )
+    return "".join(parts)
+
+
+def format_history(deleted):
+    parts = ["🗑 *История удаленных напоминаний:*\n\n"]
+    for item in deleted:
+        parts.append(
+            f"🔹 *ID:* {item['original_id']}\n"
+            f"📝 *Текст:* {item['text']}\n"
+            f"🔢 *Приоритет:* {item['priority']}\n"
+            f"🗓 *Удалено:* {item['deleted_at'].strftime('%d.%m.%Y %H:%M')}\n"
+            f"ℹ️ *Причина:* {item['reason']}\n\n"
+        )
+    return "".join(parts)
+
+
+# Экраны собираются постранично: из хранилища читается только показываемая страница.
+# Каждая функция возвращает (экран или None, момент устаревания) — как ждет RenderCache.get
+def render_reminders(db, user_id, offset=0):
+    reminders, has_more = db.get_reminders_page(user_id, offset, REMINDERS_PAGE_SIZE)
+    if not reminders:
+        return None, None
+    next_offset = offset + len(reminders) if has_more else None
+    return (format_reminders(reminders), reminders_page_markup(offset, next_offset)), earliest_expiry(reminders)
+
+
+def render_delete_choice(db, user_id, offset=0):
+    reminders, has_more = db.get_reminders_page(user_id, offset, REMINDERS_PAGE_SIZE)
+    return (delete_page_markup(reminders, offset, has_more) if reminders else None), earliest_expiry(reminders)
+
+
+def render_history(db, user_id, cursor=None, newer=False):
+    deleted, older_cursor, newer_cursor = db.get_deleted_page(user_id, HISTORY_PAGE_SIZE, cursor, newer)
+    # Историю пополняет и чистит очистка, в том числе в процессах shard_worker.py (DIGEST_IN_PROCESS=0),
+    # о которой событий нет: страница живет не дольше интервала очистки
+    valid_until = time.time() + CLEANUP_INTERVAL
+    if not deleted:
+        return None, valid_until
+    return (format_history(deleted), history_page_markup(older_cursor, newer_cursor)), valid_until
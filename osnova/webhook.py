@@ -0,0 +1,115 @@
+"""Прием обновлений Telegram через webhook вместо long polling.
+
+Встроенный HTTP-сервер принимает POST с JSON объекта Update, кладет его в
+ограниченную очередь и сразу отвечает 200. Обработчики вызываются пулом
+потоков; обновления одного чата всегда попадают в одну очередь, поэтому шаги
+диалога не перепутываются. При переполнении сервер отвечает 503, и Telegram
+повторит доставку позже.
+
+Порядок и отказ 503 работают, только если process_update обрабатывает
+обновление синхронно: бот должен быть создан с TeleBot(threaded=False),
+иначе он передаст обновление в собственный пул и вернется сразу.
+
+Локальная проверка: curl -X POST -H 'Content-Type: application/json' \
+    --data @update.json http://127.0.0.1:8443/webhook
+"""
+import json
+import queue
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def update_chat_id(update: Dict[str, Any]) -> int:
+    """Чат, к которому относится обновление; 0 — если определить нельзя"""
+    for kind in ('message', 'edited_message', 'callback_query', 'channel_post', 'inline_query'):
+        item = update.get(kind)
+        if not item:
+            continue
+        message = item.get('message', item)
+        chat = message.get('chat') or item.get('from') or {}
+        return chat.get('id', 0)
+    return 0
+
+
+class WebhookServer:
+    def __init__(self, process_update: Callable[[Dict[str, Any]], None], host: str = '0.0.0.0',
+                 port: int = 8443, path: str = '/webhook', secret_token: Optional[str] = None,
+                 workers: int = 4, queue_size: int = 1000):
+        self.process_update = process_update
+        self.path = path
+        self.secret_token = secret_token
+        # Отдельная очередь на каждый поток: чат закреплен за потоком по chat_id
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._workers = [
+            threading.Thread(target=self._work, args=(q,), name=f'webhook-{i}', daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != server.path:
+                    self.send_error(404)
+                    return
+                if server.secret_token and self.headers.get(SECRET_HEADER) != server.secret_token:
+                    self.send_error(403)
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    update = json.loads(self.rfile.read(length))
+                except ValueError:
+                    self.send_error(400)
+                    return
+                self.send_response(200 if server.submit(update) else 503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    def submit(self, update: Dict[str, Any]) -> bool:
+        """Ставит обновление в очередь его чата; False — очередь переполнена"""
+        target = self._queues[update_chat_id(update) % len(self._queues)]
+        try:
+            target.put_nowait(update)
+            return True
+        except queue.Full:
+            logger.warning("Очередь обновлений переполнена, обновление отклонено")
+            return False
+
+    def _work(self, updates: queue.Queue) -> None:
+        while True:
+            update = updates.get()
+            if update is None:
+                return
+            try:
+                self.process_update(update)
+            except Exception as e:
+                logger.error(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+
+    def serve_forever(self) -> None:
+        for worker in self._workers:
+            worker.start()
+        host, port = self.httpd.server_address[:2]
+        logger.info(f"Webhook слушает http://{host}:{port}{self.path}")
+        self.httpd.serve_forever()
+
+    def stop(self) -> None:
+        """Перестает принимать запросы и дожидается обработки уже принятых обновлений"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for updates in self._queues:
+            updates.put(None)
+        for worker in self._workers:
+            worker.join()